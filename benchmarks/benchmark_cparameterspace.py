@@ -0,0 +1,186 @@
+""" Headless benchmarks of the CParameterSpace compute and plotting paths.
+
+Runs with the Agg backend, so no window opens. The results (wall times, peak
+allocated bytes, throughputs) are written to a JSON file; passing an earlier
+file with --compare prints the ratios and exits with 1 on regressions.
+
+usage:
+    python benchmarks/benchmark_cparameterspace.py --output bench.json
+    python benchmarks/benchmark_cparameterspace.py --dims 2 3 --sizes 10 100 --output new.json --compare bench.json
+"""
+import matplotlib
+matplotlib.use("Agg")
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import ctsutils.cparameterspace as cpsm
+from ctsutils.cparameterspace import CParam, CParameterSpace
+
+
+def foo(*X):
+    """ a typical element-wise sweep function of any number of parameters """
+    s = sum(X)
+    return (1 - X[0] / 2 + X[0] ** 5 + s ** 3) * np.exp(-X[0] ** 2 - s ** 2)
+
+
+def make_cparams(dimension, size):
+    """ """
+    return [CParam("p" + str(i), np.linspace(-1, 1, size)) for i in range(dimension)]
+
+
+def measure(func, repeat=3):
+    """ minimum and median wall time over repeat runs, and the peak of the
+    allocated bytes (tracemalloc) in an extra run
+
+    Returns:
+        dict
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"time_s": min(times), "time_median_s": float(np.median(times)), "peak_bytes": peak}
+
+
+def bench_grid(dimension, size, sparse, repeat, n_slider_moves):
+    """ all benchmarks of one grid, as a list of dicts """
+    cparams = make_cparams(dimension, size)
+    n_points = size ** dimension
+    names = [cp.name for cp in cparams]
+    common = {"dimension": dimension, "size": size, "n_points": n_points, "sparse": sparse}
+    results = []
+
+    def record(benchmark, measurement, n_items=None):
+        entry = dict(common, benchmark=benchmark, **measurement)
+        if n_items is not None:
+            entry["throughput_per_s"] = n_items / max(measurement["time_s"], 1e-12)
+        results.append(entry)
+
+    record("make_meshgrid", measure(lambda: CParameterSpace(cparams, sparse=sparse), repeat))
+
+    cps = CParameterSpace(cparams, sparse=sparse)
+    record("calc_function", measure(lambda: cpsm.calc_function(cps, foo, names), repeat), n_points)
+
+    Z = cpsm.calc_function(cps, foo, names)
+    record("calc_integral", measure(lambda: cpsm.calc_integral(cps, Z, names[0]), repeat), n_points)
+
+    queries = np.random.default_rng(0).uniform(-1.1, 1.1, 1000)
+    arr = cps.get_arr(names[0])
+    record("find_nearest_idx_scalar_loop",
+           measure(lambda: [cpsm.find_nearest_idx(arr, q) for q in queries], repeat), np.size(queries))
+    record("find_nearest_idx_axis_index",
+           measure(lambda: cps.find_nearest_idx(names[0], queries), repeat), np.size(queries))
+
+    mask = np.zeros(np.shape(Z), dtype=bool)
+    mask[np.unravel_index(np.argmin(Z), np.shape(Z))] = True
+    record("get_values_from_meshgrid", measure(lambda: cpsm.get_values_from_meshgrid(mask, cps=cps), repeat))
+
+    # plot and slider latency
+    fig, ax = plt.subplots()
+    ordering = [(names[0], None), (names[1], None)] + [(name, None) for name in names[2:]]
+    t0 = time.perf_counter()
+    cpsm.plot(cps, Z, ordering_of_params_name_and_value=ordering, fig=fig, ax=ax)
+    fig.canvas.draw()
+    plot_time = time.perf_counter() - t0
+    record("plot", {"time_s": plot_time, "time_median_s": plot_time, "peak_bytes": None})
+
+    if dimension > 2:
+        cslider = cps.csliders[0]
+        slider_arr = cps.get_arr(names[2])
+        latencies = []
+        for val in np.linspace(np.min(slider_arr), np.max(slider_arr), n_slider_moves):
+            t0 = time.perf_counter()
+            cslider.set_val(val)
+            fig.canvas.draw()
+            latencies.append(time.perf_counter() - t0)
+        record("update_func", {"time_s": min(latencies), "time_median_s": float(np.median(latencies)),
+                               "time_max_s": max(latencies), "peak_bytes": None})
+
+    plt.close(fig)
+    return results
+
+
+def run(dims, sizes, max_points, repeat, n_slider_moves, sparse_modes):
+    """ """
+    results = []
+    for dimension in dims:
+        for size in sizes:
+            if size ** dimension > max_points:
+                print("skipping dimension", dimension, "size", size, ": more than", max_points, "points")
+                continue
+            for sparse in sparse_modes:
+                print("benchmarking dimension", dimension, "size", size, "sparse" if sparse else "dense")
+                results.extend(bench_grid(dimension, size, sparse, repeat, n_slider_moves))
+    return results
+
+
+def _key(entry):
+    """ """
+    return (entry["benchmark"], entry["dimension"], entry["size"], entry["sparse"])
+
+
+def compare(results, old_results, threshold):
+    """ print the time ratios new / old and return the entries slower by more than threshold """
+    old = {_key(entry): entry for entry in old_results}
+    regressions = []
+    for entry in results:
+        if _key(entry) not in old:
+            continue
+        ratio = entry["time_s"] / max(old[_key(entry)]["time_s"], 1e-12)
+        print("{:32s} d={} n={:4d} {:6s} {:8.3f}x".format(entry["benchmark"], entry["dimension"], entry["size"],
+                                                         "sparse" if entry["sparse"] else "dense", ratio))
+        if ratio > threshold:
+            regressions.append(entry)
+    return regressions
+
+
+def main(argv=None):
+    """ """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dims", type=int, nargs="+", default=[2, 3, 4, 5, 6])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 200, 500])
+    parser.add_argument("--max-points", type=float, default=2e7, help="skip grids with more points")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--slider-moves", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", choices=["dense", "sparse"], default=["dense", "sparse"])
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", help="earlier JSON output to compare against")
+    parser.add_argument("--threshold", type=float, default=1.5, help="time ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.dims, args.sizes, args.max_points, args.repeat, args.slider_moves,
+                  [mode == "sparse" for mode in args.modes])
+
+    meta = {"python": platform.python_version(), "numpy": np.__version__, "matplotlib": matplotlib.__version__,
+            "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    with open(args.output, "w") as fh:
+        json.dump({"meta": meta, "results": results}, fh, indent=1)
+    print("written to", args.output)
+
+    if args.compare is not None:
+        with open(args.compare) as fh:
+            regressions = compare(results, json.load(fh)["results"], args.threshold)
+        if regressions:
+            print(len(regressions), "regressions slower than", args.threshold, "x")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,236 @@ import matplotlib.pyplot as plt
 from matplotlib.widgets import Slider, Button, RadioButtons
 
 import operator
+import itertools
+import os
+import threading
+import time
+import json
+import functools
+import contextlib
+import tracemalloc
+import copy
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# memory budget of one block, if blockwise evaluation is needed, but no budget is given
+DEFAULT_MAX_BLOCK_BYTES = 2**27
+
+# default number of slices along the reduced axis which calc_function_reduced evaluates
+# at once, so that its peak memory is a small multiple of the size of the reduced result
+REDUCED_BLOCK_SLICES = 4
+
+# dtype in which reductions (integrals, sums, means) accumulate, independent of the storage dtype
+DEFAULT_ACCUMULATOR_DTYPE = np.float64
+
+
+def get_storage_dtype(dtype, result_dtype):
+    """ the dtype a result of result_dtype is stored with under the storage dtype policy dtype
+
+    Args:
+        dtype: None (-> result_dtype is kept) or a floating point or complex dtype, which sets
+               the precision: real floating point results are stored with its real counterpart,
+               complex ones with its complex counterpart (e.g. np.float32 or np.complex64 ->
+               np.float32 / np.complex64). Booleans and integers are kept as they are.
+               Other dtypes (e.g. np.int32) are used for all results as they are.
+        result_dtype: dtype of the computed result
+    """
+    result_dtype = np.dtype(result_dtype)
+    if dtype is None:
+        return result_dtype
+
+    dtype = np.dtype(dtype)
+    if dtype.kind not in "fc":
+        return dtype
+
+    if result_dtype.kind == "f":
+        return np.empty(0, dtype=dtype).real.dtype
+    if result_dtype.kind == "c":
+        return np.result_type(dtype, np.complex64)
+    return result_dtype
+
+
+def get_accumulator_dtype(data_dtype, accumulator_dtype=DEFAULT_ACCUMULATOR_DTYPE):
+    """ dtype of the accumulator of a reduction over data of data_dtype (complex stays complex) """
+    return np.result_type(data_dtype, accumulator_dtype)
+
+
+def _apply_storage_dtype(result, dtype):
+    """ result cast to its storage dtype (without a copy, if it has it already) """
+    if dtype is None:
+        return result
+    return np.asarray(result).astype(get_storage_dtype(dtype, np.result_type(result)), copy=False)
+
+# CProfilers which are currently recording (see CProfiler); empty -> instrumentation is off
+_active_profilers = []
+_stage_stack = threading.local()
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class CProfiler:
+    def __init__(self, track_memory=True, callback=None):
+        """ opt-in instrumentation of the stages of calc_function, calc_integral,
+        plot, update_func etc. (e.g. building the meshgrid, evaluating f,
+        slicing, drawing). Use it as a context manager:
+
+            with CProfiler() as prof:
+                Z = calc_function(cps, f, ["a", "b"])
+                plot(cps, Z)
+            prof.print_summary()
+            prof.to_json("profile.json")
+
+        Each finished stage is recorded as a dict with the keys "stage" (nested
+        stages are joined by "/", e.g. "calc_function/f"), "wall_s", "cpu_s" and
+        "peak_bytes" (the peak of the memory allocated during the stage, above
+        what was allocated at its start, or None without track_memory).
+        When no CProfiler is active, every stage costs one check of an empty list.
+
+        Args:
+            track_memory: measure peak allocations with tracemalloc (slows down
+                          allocation-heavy code while recording)
+            callback: optional function called with each record as soon as its stage finishes
+        """
+        self.track_memory = track_memory
+        self.callback = callback
+        self.records = []
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        _active_profilers.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_profilers.remove(self)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        return False
+
+    def _add_record(self, record):
+        """ """
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def stage(self, name):
+        """ context manager to time a stage of one's own code in the same way,
+        e.g. with prof.stage("draw"): fig.canvas.draw() """
+        return _CStage(name, [self])
+
+    def get_summary(self):
+        """ the records aggregated per stage, in the order of first occurrence
+
+        Returns:
+            list of dicts with the keys "stage", "calls", "wall_s" (total),
+            "wall_mean_s", "cpu_s" (total) and "peak_bytes" (maximum)
+        """
+        summary = OrderedDict()
+        for record in self.records:
+            entry = summary.setdefault(record["stage"], {"stage": record["stage"], "calls": 0,
+                                                         "wall_s": 0., "cpu_s": 0., "peak_bytes": None})
+            entry["calls"] += 1
+            entry["wall_s"] += record["wall_s"]
+            entry["cpu_s"] += record["cpu_s"]
+            if record["peak_bytes"] is not None:
+                entry["peak_bytes"] = max(entry["peak_bytes"] or 0, record["peak_bytes"])
+
+        for entry in summary.values():
+            entry["wall_mean_s"] = entry["wall_s"] / entry["calls"]
+        return list(summary.values())
+
+    def get_summary_str(self):
+        """ the summary as a table """
+        lines = ["{:48s} {:>6s} {:>11s} {:>11s} {:>11s} {:>12s}".format(
+            "stage", "calls", "wall [s]", "mean [s]", "cpu [s]", "peak [MiB]")]
+        for entry in self.get_summary():
+            peak = "-" if entry["peak_bytes"] is None else "{:.3f}".format(entry["peak_bytes"] / 2**20)
+            lines.append("{:48s} {:6d} {:11.6f} {:11.6f} {:11.6f} {:>12s}".format(
+                entry["stage"], entry["calls"], entry["wall_s"], entry["wall_mean_s"], entry["cpu_s"], peak))
+        return "\n".join(lines)
+
+    def print_summary(self):
+        """ """
+        print(self.get_summary_str())
+
+    def to_json(self, path):
+        """ write the records and the summary to a JSON file """
+        with open(path, "w") as fh:
+            json.dump({"records": self.records, "summary": self.get_summary()}, fh, indent=1)
+
+
+class _CStage:
+    def __init__(self, name, profilers):
+        """ one timed stage, recorded into all given profilers """
+        self.name = name
+        self.profilers = list(profilers)
+
+    def __enter__(self):
+        stack = getattr(_stage_stack, "stack", None)
+        if stack is None:
+            stack = _stage_stack.stack = []
+
+        self.track_memory = tracemalloc.is_tracing() and any(prof.track_memory for prof in self.profilers)
+        # also set without memory tracking: nested stages of another profiler may track it
+        self.start_memory = None
+        self.max_peak = 0
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # the enclosing stage must not lose the peak reached so far
+                stack[-1].max_peak = max(stack[-1].max_peak, peak)
+            self.start_memory = current
+            self.max_peak = current
+            tracemalloc.reset_peak()
+
+        self.path = stack[-1].path + "/" + self.name if stack else self.name
+        stack.append(self)
+
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+
+        stack = _stage_stack.stack
+        stack.pop()
+
+        peak_bytes = None
+        if self.track_memory and tracemalloc.is_tracing():
+            self.max_peak = max(self.max_peak, tracemalloc.get_traced_memory()[1])
+            peak_bytes = self.max_peak - self.start_memory
+            if stack:
+                stack[-1].max_peak = max(stack[-1].max_peak, self.max_peak)
+
+        record = {"stage": self.path, "wall_s": wall, "cpu_s": cpu, "peak_bytes": peak_bytes}
+        for prof in self.profilers:
+            prof._add_record(record)
+        return False
+
+
+def _stage(name):
+    """ context manager timing a stage for all active CProfilers (a no-op if there are none) """
+    if not _active_profilers:
+        return _NULL_STAGE
+    return _CStage(name, _active_profilers)
+
+
+def _profiled(name):
+    """ decorator: record each call of the function as a stage """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _active_profilers:
+                return func(*args, **kwargs)
+            with _CStage(name, _active_profilers):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
 
 def find_nearest_idx(array, value):
     array = np.asarray(array)
@@ -19,19 +249,29 @@ def get_values_from_meshgrid(np_bool_array, mg=None, reduced_dimensions_indices=
 
 
     if mg is None and cps is not None:
-        mg = cps._meshgrid
-
-    num_of_indep_var = len(mg)
+        # read the coordinates off the 1-D axes, instead of indexing a meshgrid array per parameter
+        reduction_tuple = tuple(filter(lambda i: i not in reduced_dimensions_indices, range(cps.get_dimension())))
+        matches = np.nonzero(np_bool_array)
+        if np.size(matches[0]) != 1:
+            raise ValueError("np_bool_array matches " + str(np.size(matches[0])) + " points instead of one; "
+                             "CParameterSpace.query_where returns all of them")
+        list_reduced = [np.asarray(cps.cparams_list[i].np_arr)[idx[0]].item()
+                        for i, idx in zip(reduction_tuple, matches)]
+    else:
+        num_of_indep_var = len(mg)
+        # the arrays of a sparse meshgrid have length 1 along all axes but their own
+        full_shape = np.broadcast_shapes(*[np.shape(arr) for arr in mg])
+        mg = [np.broadcast_to(arr, full_shape) for arr in mg]
 
-    indexing_expr = [slice(None)] * num_of_indep_var
-    for i in range(num_of_indep_var):
-        if i in reduced_dimensions_indices:
-            indexing_expr[i] = 0  # it could be any value, since the result does not depend on them (e.g. the calculated integral along x does not depend on a particular value of x)
+        indexing_expr = [slice(None)] * num_of_indep_var
+        for i in range(num_of_indep_var):
+            if i in reduced_dimensions_indices:
+                indexing_expr[i] = 0  # it could be any value, since the result does not depend on them (e.g. the calculated integral along x does not depend on a particular value of x)
 
-    # import pdb; pdb.set_trace()  # noqa BREAKPOINT
-    list_not_reduced = list((map(lambda n: (mg[n][tuple(indexing_expr)][np_bool_array]).item(), range(len(mg)))))
-    reduction_tuple = tuple(filter(lambda i: i not in reduced_dimensions_indices, range(num_of_indep_var)))
-    list_reduced = list(operator.itemgetter(*reduction_tuple)(list_not_reduced))
+        # import pdb; pdb.set_trace()  # noqa BREAKPOINT
+        list_not_reduced = list((map(lambda n: (mg[n][tuple(indexing_expr)][np_bool_array]).item(), range(len(mg)))))
+        reduction_tuple = tuple(filter(lambda i: i not in reduced_dimensions_indices, range(num_of_indep_var)))
+        list_reduced = list(operator.itemgetter(*reduction_tuple)(list_not_reduced))
 
     if return_with_names == True:
         assert cps is not None
@@ -51,14 +291,20 @@ def get_indices_from_np_where_query(np_where_query):
 def shape_arrays_for_pcolor_plotting(ps, indexing_list_indep_vars, ordered_params, dep_var_mgf):
     """ """
 
-    X = ps.get_mgf_arr(ordered_params[0].name)[
+    X = ps.get_broadcast_mgf_arr(ordered_params[0].name)[
         tuple(indexing_list_indep_vars)]
-    Y = ps.get_mgf_arr(ordered_params[1].name)[
+    Y = ps.get_broadcast_mgf_arr(ordered_params[1].name)[
         tuple(indexing_list_indep_vars)]
+    Z = get_z_slice_for_pcolor_plotting(ps, indexing_list_indep_vars, dep_var_mgf, np.shape(X))
+
+    return [X, Y, Z]
+
+def get_z_slice_for_pcolor_plotting(ps, indexing_list_indep_vars, dep_var_mgf, xy_shape):
+    """ the 2-D slice of dep_var_mgf which belongs to the X, Y arrays (of shape xy_shape)
+    of shape_arrays_for_pcolor_plotting """
     Z = None
 
-    if (np.shape(dep_var_mgf) == np.shape(X) and
-        np.shape(dep_var_mgf) == np.shape(Y)):
+    if np.shape(dep_var_mgf) == xy_shape:
         Z = dep_var_mgf
         # delivered in the appropriate shape to be plotted (e.g. after integrating out one dimension, i.e.
         # function with signature (N^d x N^d x ...) -> N^(d-1) evaluated and passed to this plotting function
@@ -74,9 +320,340 @@ def shape_arrays_for_pcolor_plotting(ps, indexing_list_indep_vars, ordered_param
         # index it from back to front until dep_var_mgf's dimensions run out
         # -> then you will get 2 dimensions for the pcolor plot
 
-        Z = dep_var_mgf[tuple(indexing_list_dep_var)] # function with signature (N^d x N^d x ...) -> N^d evaluated
+        # copy just the 2-D slice (e.g. if dep_var_mgf is a np.memmap, only this slice is read from disk)
+        Z = np.array(dep_var_mgf[tuple(indexing_list_dep_var)]) # function with signature (N^d x N^d x ...) -> N^d evaluated
+
+    return Z
+
+class CSliceCache:
+    def __init__(self, ps, dep_var_mgf, xy_shape, max_slices=32, prefetch=True):
+        """ LRU cache of the 2-D slices of dep_var_mgf shown in a plot, keyed by the
+        fixed indices of the slider axes. Optionally, a background thread loads the
+        slices next to the current slider positions ahead of time (useful if
+        dep_var_mgf is e.g. a np.memmap on a slow disk).
+
+        Args:
+            max_slices: maximum number of slices kept
+            prefetch: if True, prefetch_neighbors loads the neighboring slices in the background
+        """
+        self.ps = ps
+        self.dep_var_mgf = dep_var_mgf
+        self.xy_shape = xy_shape
+        self.max_slices = max_slices
+        self.hits = 0
+        self.misses = 0
+
+        self._slices = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    @staticmethod
+    def _get_key(indexing_list_indep_vars):
+        """ """
+        return tuple(None if isinstance(index, slice) else int(index) for index in indexing_list_indep_vars)
+
+    def _store(self, key, Z):
+        """ """
+        with self._lock:
+            self._slices[key] = Z
+            self._slices.move_to_end(key)
+            while len(self._slices) > self.max_slices:
+                self._slices.popitem(last=False)
+
+    def _load(self, indexing_list_indep_vars):
+        """ """
+        return get_z_slice_for_pcolor_plotting(self.ps, indexing_list_indep_vars, self.dep_var_mgf, self.xy_shape)
+
+    def get(self, indexing_list_indep_vars):
+        """ the slice of dep_var_mgf for the given indexing, from the cache if possible """
+        key = self._get_key(indexing_list_indep_vars)
+        with self._lock:
+            Z = self._slices.get(key)
+            if Z is not None:
+                self._slices.move_to_end(key)
+                self.hits += 1
+                return Z
+            self.misses += 1
+
+        Z = self._load(indexing_list_indep_vars)
+        self._store(key, Z)
+        return Z
+
+    def _prefetch(self, key, indexing_list_indep_vars):
+        """ runs in the background thread """
+        try:
+            with self._lock:
+                if key in self._slices:
+                    return
+            self._store(key, self._load(indexing_list_indep_vars))
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def prefetch_neighbors(self, indexing_list_indep_vars):
+        """ load the slices one step away along each slider axis in the background """
+        if self._executor is None:
+            return
+
+        for ax, index in enumerate(indexing_list_indep_vars):
+            if isinstance(index, slice):
+                continue
+            for neighbor in (index - 1, index + 1):
+                if not 0 <= neighbor < self.ps.get_shape()[ax]:
+                    continue
+                neighbor_indexing = list(indexing_list_indep_vars)
+                neighbor_indexing[ax] = neighbor
+                key = self._get_key(neighbor_indexing)
+                with self._lock:
+                    if key in self._slices or key in self._pending:
+                        continue
+                    self._pending.add(key)
+                self._executor.submit(self._prefetch, key, neighbor_indexing)
+
+    def close(self):
+        """ stop the prefetching thread (pending prefetches are cancelled);
+        the cache can still be used afterwards, without prefetching """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+def _get_cell_edges(arr):
+    """ edges of the cells around the (strictly monotonic) points of arr """
+    arr = np.asarray(arr, dtype=float)
+    if np.size(arr) == 1:
+        return np.array([arr[0] - 0.5, arr[0] + 0.5])
+    inner = (arr[:-1] + arr[1:]) / 2.
+    return np.concatenate([[2 * arr[0] - inner[0]], inner, [2 * arr[-1] - inner[-1]]])
+
+
+def _reduce_blocks(C, fy, fx, ufunc):
+    """ ufunc (e.g. np.fmin) reduced over the fy x fx blocks of C, whose shape is a multiple of the blocks'
+    (as a few vectorized calls on strided views, much faster than reducing a reshaped (ny, fy, nx, fx) array) """
+    R = np.array(C[:, 0::fx])
+    for k in range(1, fx):
+        ufunc(R, C[:, k::fx], out=R)
+    S = np.array(R[0::fy])
+    for k in range(1, fy):
+        ufunc(S, R[k::fy], out=S)
+    return S
+
+
+def decimate_min_max(C, fy, fx):
+    """ reduce a 2-D array by the factors fy, fx: each block is represented by its minimum
+    or its maximum, whichever is farther from the block's mean, so that peaks and dips
+    stay visible in the decimated image. NaN are ignored.
+
+    Returns:
+        array of shape (ceil(ny / fy), ceil(nx / fx))
+    """
+    C = np.asarray(C, dtype=float)
+    ny, nx = np.shape(C)
+    nby, nbx = -(-ny // fy), -(-nx // fx)
+    if (nby * fy, nbx * fx) != (ny, nx):
+        # repeating the last row / column doesn't change the extremes of the blocks at the end
+        C = np.pad(C, ((0, nby * fy - ny), (0, nbx * fx - nx)), mode="edge")
+
+    # fmin / fmax ignore NaN (and give NaN for all-NaN blocks)
+    block_min = _reduce_blocks(C, fy, fx, np.fmin)
+    block_max = _reduce_blocks(C, fy, fx, np.fmax)
+
+    invalid = np.isnan(C)
+    if invalid.any():
+        block_mean = (_reduce_blocks(np.where(invalid, 0., C), fy, fx, np.add) /
+                      np.maximum(_reduce_blocks((~invalid).astype(float), fy, fx, np.add), 1))
+    else:
+        block_mean = _reduce_blocks(C, fy, fx, np.add) / (fy * fx)
+
+    return np.where(block_max - block_mean > block_mean - block_min, block_max, block_min)
 
-    return [X, Y, Z]
+
+class CSliceRenderer:
+    def __init__(self, ax, x_arr, y_arr, z_axes_are_xy, method="auto", lod=True):
+        """ draws the 2-D slices of a plot: with imshow if both axes are uniformly spaced,
+        with pcolormesh on their cell edges otherwise. With lod, only the visible part of
+        a slice is drawn, decimated (see decimate_min_max) to about the pixel resolution of
+        the axes; after zooming in, redrawing fetches the finer detail.
+
+        Args:
+            x_arr, y_arr: 1-D arrays of the parameters on the x and y axis
+            z_axes_are_xy: True if the slices have x along their first axis, False for y
+            method: "auto", "imshow" (only for uniform axes) or "pcolormesh"
+            lod: decimate slices with more cells than pixels
+        """
+        self.ax = ax
+        self.z_axes_are_xy = z_axes_are_xy
+        self.colorbar = None
+        self.artist = None
+
+        x_index, y_index = CAxisIndex(x_arr), CAxisIndex(y_arr)
+
+        # flip descending axes, so that both are ascending
+        self.flip_x = np.size(x_arr) > 1 and x_arr[-1] < x_arr[0]
+        self.flip_y = np.size(y_arr) > 1 and y_arr[-1] < y_arr[0]
+        self.x_arr = np.asarray(x_arr)[::-1] if self.flip_x else np.asarray(x_arr)
+        self.y_arr = np.asarray(y_arr)[::-1] if self.flip_y else np.asarray(y_arr)
+
+        # the cells need strictly monotonic axes, otherwise fall back to pcolormesh on the 2-D X, Y grid
+        self.is_monotonic = all(np.size(arr) < 2 or np.all(np.diff(arr) > 0) for arr in (self.x_arr, self.y_arr))
+
+        if method == "auto":
+            is_uniform = all(index.size < 2 or index.is_uniform for index in (x_index, y_index))
+            method = "imshow" if is_uniform and self.is_monotonic else "pcolormesh"
+        if method == "imshow" and not all(index.size < 2 or index.is_uniform for index in (x_index, y_index)):
+            raise ValueError("imshow needs uniformly spaced axes")
+        self.method = method
+        self.lod = lod and self.is_monotonic
+
+        self.x_edges = _get_cell_edges(self.x_arr) if self.is_monotonic else None
+        self.y_edges = _get_cell_edges(self.y_arr) if self.is_monotonic else None
+
+    def _get_image(self, Z):
+        """ Z as an image, i.e. with y along the first axis and both axes ascending (a view) """
+        C = np.asarray(Z).T if self.z_axes_are_xy else np.asarray(Z)
+        return C[::-1 if self.flip_y else 1, ::-1 if self.flip_x else 1]
+
+    def _get_visible_range(self, arr, lim):
+        """ index range of the cells of arr which are (partly) inside lim """
+        lo, hi = min(lim), max(lim)
+        start = max(int(np.searchsorted(arr, lo)) - 1, 0)
+        stop = min(int(np.searchsorted(arr, hi, side="right")) + 1, np.size(arr))
+        return start, max(stop, start + 1)
+
+    def _get_pixels(self):
+        """ width and height of the axes in pixels """
+        bbox = self.ax.get_window_extent()
+        return max(int(bbox.width), 1), max(int(bbox.height), 1)
+
+    def _get_lod_image(self, C):
+        """ the visible part of the image C, decimated to the pixel resolution, and its cell edges """
+        x0, x1 = self._get_visible_range(self.x_arr, self.ax.get_xlim())
+        y0, y1 = self._get_visible_range(self.y_arr, self.ax.get_ylim())
+        C = C[y0:y1, x0:x1]
+
+        width, height = self._get_pixels()
+        fx, fy = max(-(-(x1 - x0) // width), 1), max(-(-(y1 - y0) // height), 1)
+        if fx > 1 or fy > 1:
+            C = decimate_min_max(C, fy, fx)
+
+        def block_edges(edges, start, stop, f, n_blocks):
+            if self.method == "imshow":
+                # blocks padded at the end keep the cell size
+                return edges[start] + (edges[start + 1] - edges[start]) * f * np.arange(n_blocks + 1)
+            return np.append(edges[start:stop:f], edges[stop])
+
+        return C, block_edges(self.x_edges, x0, x1, fx, np.shape(C)[1]), block_edges(self.y_edges, y0, y1, fy, np.shape(C)[0])
+
+    def show(self, Z, X=None, Y=None):
+        """ draw the slice Z (on the first call, the artist is created)
+
+        Args:
+            X, Y: the 2-D coordinate arrays, only needed on the first call if the axes are not monotonic
+        Returns:
+            the artist (AxesImage or QuadMesh)
+        """
+        if not self.is_monotonic:
+            if self.artist is None:
+                self.artist = self.ax.pcolormesh(X, Y, Z)
+            else:
+                self.artist.set_array(Z)
+            return self.artist
+
+        C = self._get_image(Z)
+        x_edges, y_edges = self.x_edges, self.y_edges
+        if self.lod:
+            C, x_edges, y_edges = self._get_lod_image(C)
+
+        if self.method == "imshow":
+            extent = (x_edges[0], x_edges[-1], y_edges[0], y_edges[-1])
+            if self.artist is None:
+                self.artist = self.ax.imshow(C, origin="lower", extent=extent, aspect="auto", interpolation="nearest")
+            else:
+                self.artist.set_data(C)
+                self.artist.set_extent(extent)
+        elif self.artist is not None and not self.lod:
+            self.artist.set_array(C)
+        else:
+            # the number of cells may have changed -> replace the QuadMesh, keeping its norm and colormap
+            old = self.artist
+            self.artist = self.ax.pcolormesh(x_edges, y_edges, C, shading="flat",
+                                             **({} if old is None else {"norm": old.norm, "cmap": old.cmap}))
+            if old is not None:
+                old.remove()
+                if self.colorbar is not None:
+                    self.colorbar.update_normal(self.artist)
+
+        return self.artist
+
+
+class CPlotState:
+    def __init__(self, mesh, indexing_list_indep_vars, ordered_params, dep_var_mgf, xy_shape, update_clim=True,
+                 slice_cache=None, renderer=None):
+        """ what the sliders of a plot need to update it: the one mesh artist,
+        whose data array is replaced on every slider movement, and the current indexing
+
+        Args:
+            mesh: the artist showing the slice (QuadMesh or AxesImage)
+            indexing_list_indep_vars: see CParameterSpace._get_indexing_list_and_ordered_params
+            xy_shape: shape of the X, Y arrays (computed once when plotting)
+            update_clim: if True, the color limits follow the data of the shown slice
+            slice_cache: optional CSliceCache the slices are taken from
+            renderer: the CSliceRenderer which draws the slices (None: mesh.set_array)
+        """
+        self.mesh = mesh
+        self.indexing_list_indep_vars = list(indexing_list_indep_vars)
+        self.ordered_params = ordered_params
+        self.dep_var_mgf = dep_var_mgf
+        self.xy_shape = xy_shape
+        self.update_clim = update_clim
+        self.slice_cache = slice_cache
+        self.renderer = renderer
+
+        self._z = None  # the slice shown last
+        self._redrawing = False
+
+    def get_z(self, ps):
+        """ the 2-D slice for the current indexing """
+        if self.slice_cache is not None:
+            Z = self.slice_cache.get(self.indexing_list_indep_vars)
+            self.slice_cache.prefetch_neighbors(self.indexing_list_indep_vars)
+            return Z
+
+        return get_z_slice_for_pcolor_plotting(ps, self.indexing_list_indep_vars, self.dep_var_mgf, self.xy_shape)
+
+    def redraw(self, ps, fig, refetch=True, draw_idle=True):
+        """ show the slice of the current indexing (e.g. after a slider movement,
+        or after dep_var_mgf was filled in further)
+
+        Args:
+            refetch: if False, show the last slice again (e.g. in a different zoom window)
+            draw_idle: if False, only update the artist, the caller draws the figure
+        """
+        if self._redrawing:  # changing an image's extent may change the axis limits, which calls redraw again
+            return
+        self._redrawing = True
+        try:
+            with _stage("slice"):
+                if refetch or self._z is None:
+                    self._z = self.get_z(ps)
+                Z = self._z
+            with _stage("set_array"):
+                if self.renderer is not None:
+                    self.mesh = self.renderer.show(Z)
+                else:
+                    self.mesh.set_array(Z)
+                # the limits of the full slice, also if a decimated one is shown
+                if self.update_clim and np.any(np.isfinite(Z)):
+                    self.mesh.set_clim(np.nanmin(Z), np.nanmax(Z))
+        finally:
+            self._redrawing = False
+
+        if not draw_idle:
+            return
+        # the drawing itself happens later, in the event loop; to time it,
+        # draw explicitly inside CProfiler.stage, e.g. with prof.stage("draw"): fig.canvas.draw()
+        with _stage("draw_idle"):
+            fig.canvas.draw_idle()
 
 class CParam:
     def __init__(self, name, np_arr, unit=None):
@@ -103,6 +680,134 @@ class CParam:
 
         return self.name
 
+class CAxisIndex:
+    def __init__(self, np_arr, rtol=1e-6):
+        """ metadata of one axis (the 1-D array of a CParam), computed once,
+        to make lookups on that axis cheap.
+
+        Args:
+            np_arr: 1-D numpy array of the parameter values
+            rtol: tolerance (relative to the step) up to which the values
+                  are considered uniformly (or log-uniformly) spaced
+        """
+        self.np_arr = np.asarray(np_arr)
+        self.size = np.size(self.np_arr)
+
+        # lookups by value need a non-empty numeric axis; other axes (strings, dates,
+        # booleans, empty) can still be part of a space, they are only indexed by position
+        self.is_numeric = self.np_arr.dtype.kind in "iuf" and self.size >= 1
+
+        self.min = None
+        self.max = None
+        self.is_sorted = False
+
+        # for unsorted axes keep a sorted copy and the permutation to get back
+        self._order = None
+        self._sorted_arr = self.np_arr
+
+        self.is_uniform = False
+        self.step = None
+        self.is_log_uniform = False
+        self.log_step = None
+
+        if not self.is_numeric:
+            return
+
+        self.min = np.min(self.np_arr)
+        self.max = np.max(self.np_arr)
+
+        self.is_sorted = bool(np.all(np.diff(self.np_arr) >= 0))  # ascending
+        if not self.is_sorted:
+            self._order = np.argsort(self.np_arr, kind="stable")
+            self._sorted_arr = self.np_arr[self._order]
+
+        if self.size >= 2:
+            self.step = (self.np_arr[-1] - self.np_arr[0]) / (self.size - 1)
+            if self.step != 0:
+                ideal = self.np_arr[0] + self.step * np.arange(self.size)
+                self.is_uniform = bool(np.all(np.abs(self.np_arr - ideal) <= rtol * np.abs(self.step)))
+
+            if not self.is_uniform and self.min > 0:
+                log_arr = np.log(self.np_arr)
+                self.log_step = (log_arr[-1] - log_arr[0]) / (self.size - 1)
+                if self.log_step != 0:
+                    ideal = log_arr[0] + self.log_step * np.arange(self.size)
+                    self.is_log_uniform = bool(np.all(np.abs(log_arr - ideal) <= rtol * np.abs(self.log_step)))
+
+    def _check_numeric(self):
+        """ """
+        if not self.is_numeric:
+            raise TypeError("can't look up values on an axis of " +
+                            ("size 0" if self.size == 0 else "dtype " + str(self.np_arr.dtype)) +
+                            ", only on non-empty integer or floating point axes")
+
+    def find_nearest_idx(self, value):
+        """ index of the value in the axis which is closest to value, like the module level
+        find_nearest_idx, but O(1) on (log-)uniform axes and O(log N) otherwise.
+        value can be a scalar or an array of query values (NaN raises ValueError). """
+        self._check_numeric()
+        value = np.asarray(value)
+        if np.any(np.isnan(value)):
+            raise ValueError("no nearest grid point of NaN")
+
+        if self.size == 1:
+            return np.zeros(np.shape(value), dtype=np.intp)[()]
+
+        # get the lower of the two candidate neighbors, then compare the two
+        if self.is_uniform:
+            lo = np.floor((value - self.np_arr[0]) / self.step)
+            arr = self.np_arr
+        elif self.is_log_uniform:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                lo = np.floor((np.log(value) - np.log(self.np_arr[0])) / self.log_step)
+            lo = np.where(value > 0, lo, -1 if self.log_step > 0 else self.size)
+            arr = self.np_arr
+        else:
+            lo = np.searchsorted(self._sorted_arr, value) - 1
+            arr = self._sorted_arr
+
+        lo = np.clip(lo, 0, self.size - 2).astype(np.intp)
+        hi = lo + 1
+        idx = np.where(np.abs(arr[hi] - value) < np.abs(arr[lo] - value), hi, lo)
+
+        if arr is self._sorted_arr and self._order is not None:
+            idx = self._order[idx]
+
+        return idx[()]
+
+    def find_bracketing_idx(self, value):
+        """ for linear interpolation: indices lo, hi of the grid points next to value
+        and the weight t of hi, value = (1 - t) * np_arr[lo] + t * np_arr[hi].
+        t < 0 or t > 1 means value lies outside of the axis' range.
+        value can be a scalar or an array of query values; for NaN, t is NaN. """
+        self._check_numeric()
+        value = np.asarray(value, dtype=float)
+
+        if self.size == 1:
+            zeros = np.zeros(np.shape(value), dtype=np.intp)
+            return zeros, zeros, np.where(value == self.np_arr[0], 0., np.inf)
+
+        if self.is_uniform:
+            lo = np.floor((value - self.np_arr[0]) / self.step)
+            arr = self.np_arr
+        elif self.is_log_uniform:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                lo = np.floor((np.log(value) - np.log(self.np_arr[0])) / self.log_step)
+            lo = np.where(value > 0, lo, -1 if self.log_step > 0 else self.size)
+            arr = self.np_arr
+        else:
+            lo = np.searchsorted(self._sorted_arr, value, side="right") - 1
+            arr = self._sorted_arr
+
+        lo = np.clip(np.nan_to_num(lo), 0, self.size - 2).astype(np.intp)
+        hi = lo + 1
+        t = (value - arr[lo]) / (arr[hi] - arr[lo])
+
+        if arr is self._sorted_arr and self._order is not None:
+            lo, hi = self._order[lo], self._order[hi]
+
+        return lo, hi, t
+
 class CSlider(Slider):
     # def __init__(self, param, *mpl_slider_args, **mpl_slider_kwargs):
     #     """
@@ -120,83 +825,289 @@ class CSlider(Slider):
         Slider.on_changed(self, on_changed_func)
 
 class CParameterSpace:
-    def __init__(self, cparams_list):
-        """ """
+    # True for spaces whose points are not a tensor grid, but a flat list
+    # (e.g. cparameterspace_sampling.CSampledParameterSpace)
+    is_flat = False
+
+    def __init__(self, cparams_list, sparse=False, dtype=None, accumulator_dtype=DEFAULT_ACCUMULATOR_DTYPE):
+        """
+        Args:
+            cparams_list: list of CParam objects, one per independent variable
+            sparse: if True, the meshgrid is not allocated densely; each parameter
+                    only gets an array of shape (1, ..., N_i, ..., 1), which broadcasts
+                    against the others. Memory then grows with the sum of the axis
+                    lengths instead of their product.
+            dtype: storage dtype policy (see get_storage_dtype) of the meshgrid arrays and of the
+                   results of calc_function, calc_integral etc., e.g. np.float32 to halve
+                   memory and bandwidth (complex results are then stored as np.complex64).
+                   None keeps the dtypes of the CParams' arrays and of the results.
+            accumulator_dtype: dtype reductions accumulate in, independent of the storage dtype
+        """
         self.cparams_list = cparams_list
+        self.sparse = sparse
+        self.dtype = dtype
+        self.accumulator_dtype = accumulator_dtype
 
         for cp in self.cparams_list:
             vars(self)[cp.name] = cp
 
+        self._make_axis_indices()
+
         self._meshgrid = None
         self._make_meshgrid()
 
+    def _make_axis_indices(self):
+        """ build the lookup structures for the parameters once: a name -> position
+        dict and one CAxisIndex per parameter """
+        self._name_to_position = {}
+        for i, cp in enumerate(self.cparams_list):
+            if cp.name in self._name_to_position:
+                raise ValueError("parameter contained twice: " + str(cp.name))
+            self._name_to_position[cp.name] = i
+
+        self._axis_indices = [CAxisIndex(cp.np_arr) for cp in self.cparams_list]
+
+    @_profiled("make_meshgrid")
     def _make_meshgrid(self):
         """ once the cparams_list is initialized, use numpy's meshgrid to
         create multidimensional arrays of the same shape for each parameter.
         Always make sure that indexing is 'ij', otherwise the dimensions will
         switch around. """
-        just_arrays = [cparam.np_arr for cparam in self.cparams_list]
-        self._meshgrid = np.meshgrid(*just_arrays, indexing="ij")
+        just_arrays = [_apply_storage_dtype(cparam.np_arr, self.dtype) for cparam in self.cparams_list]
+        self._meshgrid = np.meshgrid(*just_arrays, indexing="ij", sparse=self.sparse)
 
     def get_mgf_arr(self, param_name):
         """ a meshgridified array is one of the return values of A, B, _ = np.meshgrid(a, b, ...);
         they all have the same dimensionality so that they can be plugged into a normal mathematical
         python function """
-        if self._meshgrid is not None:
-            return self._meshgrid[self.get_index_of(param_name)]
-        else:
-            print("no _meshgrid generated yet")
-            exit(1)
+        if self._meshgrid is None:
+            raise RuntimeError("no _meshgrid generated yet")
 
-    def get_index_of(self, name):
-        """ """
-        els = []
-        for i, cp in enumerate(self.cparams_list):
-            if cp.name == name:
-                els.append(i)
+        return self._meshgrid[self.get_index_of(param_name)]
 
-        if len(els) == 1:
-            return els[0]
-        else:
-            print("parameter occurs not once: ", els)
-            exit(1)
+    def get_broadcast_mgf_arr(self, param_name):
+        """ like get_mgf_arr, but always of the full grid shape. In sparse mode this
+        is a read-only zero-copy view (np.broadcast_to), so nothing is allocated. """
+        return np.broadcast_to(self.get_mgf_arr(param_name), self.get_shape())
+
+    def get_broadcast_meshgrid(self):
+        """ list of full-shape (possibly broadcast) meshgrid arrays, in the order of cparams_list """
+        return [self.get_broadcast_mgf_arr(cp.name) for cp in self.cparams_list]
+
+    def get_index_of(self, name):
+        """ position of the parameter in cparams_list (and therefore axis in the meshgrid) """
+        try:
+            return self._name_to_position[name]
+        except KeyError:
+            raise KeyError("no parameter named " + repr(name)) from None
 
     def get_param_by_name(self, name):
         """ """
-        els = []
-        for i, cp in enumerate(self.cparams_list):
-            if cp.name == name:
-                els.append(cp)
-
-        if len(els) == 1:
-            return els[0]
-        else:
-            print("parameter contained twice: ", els)
-            exit(1)
+        return self.cparams_list[self.get_index_of(name)]
 
     def get_arr(self, name):
         """ """
-        els = []
+        return self.cparams_list[self.get_index_of(name)].np_arr
+
+    def get_axis_index(self, name):
+        """ the precomputed CAxisIndex of a parameter """
+        return self._axis_indices[self.get_index_of(name)]
+
+    def find_nearest_idx(self, name, value):
+        """ index of the grid point of parameter name closest to value """
+        return self.get_axis_index(name).find_nearest_idx(value)
+
+    def find_nearest_grid_points(self, params_names_and_values):
+        """ vectorized nearest-grid-point lookup of many query points at once
+        (np.searchsorted on sorted axes, direct arithmetic on uniform ones)
+
+        Args:
+            params_names_and_values: dict or list of tuples (param name, array of query values);
+                                     the arrays of the different parameters are broadcast against each other
+        Returns:
+            indices, values: dicts param name -> array of the nearest grid indices / grid values
+        """
+        if isinstance(params_names_and_values, dict):
+            params_names_and_values = list(params_names_and_values.items())
+
+        names = [name for name, _ in params_names_and_values]
+        query_arrays = np.broadcast_arrays(*[np.asarray(values) for _, values in params_names_and_values])
+
+        indices = {}
+        values = {}
+        for name, query in zip(names, query_arrays):
+            indices[name] = self.find_nearest_idx(name, query)
+            values[name] = self.get_arr(name)[indices[name]]
+
+        return indices, values
+
+    def _get_value_range_slice(self, name, value_slice):
+        """ the index slice of the grid points of a parameter with
+        value_slice.start <= value <= value_slice.stop (None: no bound) """
+        arr = np.asarray(self.get_arr(name))
+        in_range = np.ones(np.shape(arr), dtype=bool)
+        if value_slice.start is not None:
+            in_range &= arr >= value_slice.start
+        if value_slice.stop is not None:
+            in_range &= arr <= value_slice.stop
+
+        idx = np.flatnonzero(in_range)
+        if np.size(idx) == 0:
+            raise ValueError("no grid points of " + str(name) + " in " + str(value_slice))
+        if idx[-1] - idx[0] + 1 != np.size(idx):
+            # only a contiguous range of indices gives a view
+            raise ValueError("the values of " + str(name) + " in " + str(value_slice) +
+                             " are not contiguous (unsorted axis); select them with isel")
+        return slice(int(idx[0]), int(idx[-1]) + 1, value_slice.step)
+
+    def isel(self, params_names_and_selections):
+        """ subspace by index: the selected parameters are restricted to an index range
+        (a slice) or fixed at an index (an int, the parameter is dropped). The subspace's
+        axes and meshgrid arrays are views of this space's, so no grid data is copied.
+
+        Args:
+            params_names_and_selections: dict or list of tuples (param name, slice or int)
+        Returns:
+            (subspace, index): index is a tuple of ints and slices, so that dep_var_mgf[index]
+            is the view of a result of this space which belongs to the subspace
+        """
+        if self.is_flat:
+            raise TypeError("subspaces need a tensor grid, not a " + type(self).__name__)
+
+        if not isinstance(params_names_and_selections, dict):
+            params_names_and_selections = dict(params_names_and_selections)
+
+        index = [slice(None)] * self.get_dimension()
+        for name, selection in params_names_and_selections.items():
+            if not isinstance(selection, slice):
+                selection = operator.index(selection)
+            index[self.get_index_of(name)] = selection
+        index = tuple(index)
+
+        subspace = copy.copy(self)
         for cp in self.cparams_list:
-            if cp.name == name:
-                els.append(cp)
+            vars(subspace).pop(cp.name, None)
 
-        if len(els) == 1:
-            return els[0].np_arr
-        else:
-            print("parameter contained twice: ", els)
-            exit(1)
+        subspace.cparams_list = [CParam(cp.name, cp.np_arr[sl], unit=cp.unit)
+                                 for cp, sl in zip(self.cparams_list, index) if isinstance(sl, slice)]
+        for cp in subspace.cparams_list:
+            vars(subspace)[cp.name] = cp
+        subspace._make_axis_indices()
+
+        # sparse meshgrid arrays have length 1 along the other parameters' axes -> index those with 0 / :
+        subspace._meshgrid = [mg[tuple(sl if np.shape(mg)[ax] != 1 else (slice(None) if isinstance(sl, slice) else 0)
+                                       for ax, sl in enumerate(index))]
+                              for mg, sl in zip(self._meshgrid, index) if isinstance(sl, slice)]
+
+        return subspace, index
+
+    def sel(self, params_names_and_selections):
+        """ subspace by value, see isel: the selected parameters are restricted to a
+        range of values (a slice(min value, max value), both inclusive, None for no bound;
+        the step, if given, is an index step) or fixed at the grid point nearest to a value
+
+        Args:
+            params_names_and_selections: dict or list of tuples (param name, slice or value)
+        Returns:
+            (subspace, index), see isel
+        """
+        if not isinstance(params_names_and_selections, dict):
+            params_names_and_selections = dict(params_names_and_selections)
+
+        index_selections = {}
+        for name, selection in params_names_and_selections.items():
+            if isinstance(selection, slice):
+                index_selections[name] = self._get_value_range_slice(name, selection)
+            else:
+                index_selections[name] = int(self.find_nearest_idx(name, selection))
+
+        return self.isel(index_selections)
+
+    def _get_points(self, params_indices, value_index, n_points, dep_var_mgf, reduced_dimensions_indices):
+        """ structured array with one field per (not reduced) parameter holding its values
+        at params_indices, and a field "value" with the values of dep_var_mgf at value_index """
+        params = [cp for i, cp in enumerate(self.cparams_list) if i not in reduced_dimensions_indices]
+
+        dtype = [(cp.name, np.asarray(cp.np_arr).dtype) for cp in params] + [("value", np.asarray(dep_var_mgf).dtype)]
+        points = np.empty(n_points, dtype=dtype)
+        for cp, idx in zip(params, params_indices):
+            points[cp.name] = np.asarray(cp.np_arr)[idx]
+        points["value"] = dep_var_mgf[tuple(value_index)]
 
+        return points
+
+    def _check_result_shape(self, dep_var_mgf, reduced_dimensions_indices):
+        """ """
+        shape = tuple(n for i, n in enumerate(self.get_shape()) if i not in reduced_dimensions_indices)
+        if np.shape(dep_var_mgf) != shape:
+            raise ValueError("result has shape " + str(np.shape(dep_var_mgf)) + ", expected " + str(shape) +
+                             " (reduced_dimensions_indices: " + str(list(reduced_dimensions_indices)) + ")")
+        return shape
+
+    def query_flat_indices(self, flat_indices, dep_var_mgf, reduced_dimensions_indices=[]):
+        """ named coordinates and values of the points at flat_indices of dep_var_mgf
+
+        Args:
+            reduced_dimensions_indices: the indices of the parameters which are not axes
+                                        of dep_var_mgf anymore (e.g. integrated over), see get_values_from_meshgrid
+        Returns:
+            structured array with one field per remaining parameter and a field "value"
+        """
+        shape = self._check_result_shape(dep_var_mgf, reduced_dimensions_indices)
+        flat_indices = np.asarray(flat_indices, dtype=np.intp)
+        multi_index = np.unravel_index(flat_indices, shape)
+        return self._get_points(multi_index, multi_index, np.size(flat_indices), dep_var_mgf, reduced_dimensions_indices)
+
+    def query_where(self, np_bool_array, dep_var_mgf, reduced_dimensions_indices=[]):
+        """ all points where np_bool_array is True (see query_flat_indices) """
+        return self.query_flat_indices(np.flatnonzero(np_bool_array), dep_var_mgf, reduced_dimensions_indices)
+
+    def query_argmin(self, dep_var_mgf, reduced_dimensions_indices=[]):
+        """ the point with the smallest value (NaNs ignored), as a structured scalar """
+        return self.query_flat_indices([np.nanargmin(dep_var_mgf)], dep_var_mgf, reduced_dimensions_indices)[0]
+
+    def query_argmax(self, dep_var_mgf, reduced_dimensions_indices=[]):
+        """ the point with the largest value (NaNs ignored), as a structured scalar """
+        return self.query_flat_indices([np.nanargmax(dep_var_mgf)], dep_var_mgf, reduced_dimensions_indices)[0]
+
+    def query_smallest(self, dep_var_mgf, k, reduced_dimensions_indices=[]):
+        """ the k points with the smallest values, sorted ascending (np.argpartition, i.e. O(N + k log k)) """
+        flat = np.ravel(dep_var_mgf)
+        k = min(k, flat.size)
+        flat_indices = np.argpartition(flat, k - 1)[:k] if k < flat.size else np.arange(flat.size)
+        flat_indices = flat_indices[np.argsort(flat[flat_indices], kind="stable")]
+        return self.query_flat_indices(flat_indices, dep_var_mgf, reduced_dimensions_indices)
+
+    def query_largest(self, dep_var_mgf, k, reduced_dimensions_indices=[]):
+        """ the k points with the largest values, sorted descending """
+        flat = np.ravel(dep_var_mgf)
+        k = min(k, flat.size)
+        flat_indices = np.argpartition(flat, flat.size - k)[flat.size - k:] if k < flat.size else np.arange(flat.size)
+        flat_indices = flat_indices[np.argsort(-flat[flat_indices], kind="stable")]
+        return self.query_flat_indices(flat_indices, dep_var_mgf, reduced_dimensions_indices)
+
+    def query_below(self, dep_var_mgf, threshold, reduced_dimensions_indices=[]):
+        """ all points with values below threshold """
+        return self.query_where(np.less(dep_var_mgf, threshold), dep_var_mgf, reduced_dimensions_indices)
 
     def get_dimension(self):
         """ """
         return len(self.cparams_list)
 
+    def get_shape(self):
+        """ shape of the full (dense) grid, i.e. (N1, N2, ..., Nd) """
+        return tuple(np.size(cp.np_arr) for cp in self.cparams_list)
+
     def get_param_names(self):
         """ """
         return [cparam.name for cparam in self.cparams_list]
 
-    def _make_sliders(self, indexing_list_indep_vars, ordered_params, ordering_of_params_name_and_value, dep_var_mgf, fig, ax):
+    def export_frames(self, dep_var_mgf, path, **kwargs):
+        """ see cparameterspace_export.export_frames """
+        from ctsutils.cparameterspace_export import export_frames
+        return export_frames(self, dep_var_mgf, path, **kwargs)
+
+    def _make_sliders(self, indexing_list_indep_vars, ordered_params, plot_state, fig, ax):
         """ for all dimensions > 2, a slider is made """
         self.csliders = []
 
@@ -226,60 +1137,36 @@ class CParameterSpace:
                 else:
                     print("index_expr.start is not an int : ", index_expr)
             else:
-                print("err: index_expr neither an int nor a slice : ", index_expr)
-                exit(1)
+                raise TypeError("index_expr neither an int nor a slice : " + repr(index_expr))
 
             # slider = Slider(mpl_slider_ax, param.name, np.min(param.np_arr), np.max(param.np_arr), **mpl_slider_kwargs)
 
             cslider = CSlider(mpl_slider_ax, param.name, np.min(param.np_arr), np.max(param.np_arr), **mpl_slider_kwargs)
 
-            cslider.on_changed(CParameterSpace.update_func, args_opt=(cslider, self, param, ordering_of_params_name_and_value, dep_var_mgf, fig, ax))
+            cslider.on_changed(CParameterSpace.update_func, args_opt=(cslider, self, param, plot_state, fig, ax))
 
             self.csliders.append(cslider)
 
             # print("making slider of " + param.name + ", with init val: ", init_val)
 
-    # TODO
     @staticmethod
-    def update_func(val, cslider, cps, param, ordering_of_params_name_and_value, dep_var_mgf, fig, ax):
-        """ """
-        if not (param.np_arr == val).any(): # if val is not exactly on a data point
-            nearest_idx = find_nearest_idx(param.np_arr, val)
-            nearest_val = param.np_arr[nearest_idx]
+    @_profiled("update_func")
+    def update_func(val, cslider, cps, param, plot_state, fig, ax):
+        """ update the plot after a slider movement: only the data array (and
+        optionally the color limits) of the retained mesh artist is replaced """
+        nearest_idx = cps.find_nearest_idx(param.name, val)
+        nearest_val = param.np_arr[nearest_idx]
+        if nearest_val != val: # if val is not exactly on a data point
             # print("resetting slider for ", param.name, " from ", val, " to ", nearest_val)
+            # update the slider to show the actual value of the grid point, not the continuous slider value
+            # (this calls update_func again, with the grid value)
             cslider.set_val(nearest_val)
+            return
 
-        # update the pcolor chart
-        updated_ordering_of_params_name_and_value = []
-
-        contains_it = False
-        for i, (asked_pname, asked_pvalue) in enumerate(ordering_of_params_name_and_value):
-            new_tuple = [asked_pname, asked_pvalue]
-            if asked_pname == param.name:
-                new_tuple[1] = val
-                contains_it = True
-
-            updated_ordering_of_params_name_and_value.append(tuple(new_tuple))
-
-        if contains_it == False: # in case it's not contained yet, it must be added
-            updated_ordering_of_params_name_and_value.append(
-                (param.name, val))
-
-        indexing_list_indep_vars, ordered_params = cps._get_indexing_list_and_ordered_params(updated_ordering_of_params_name_and_value)
-
-        X, Y, Z = shape_arrays_for_pcolor_plotting(cps, indexing_list_indep_vars, ordered_params, dep_var_mgf)
-        c = ax.pcolor(X, Y, Z# , shading="nearest"
-        )
-        # cbar = fig.colorbar(c, ax=ax)
-        # cbar.ax.set_ylabel(z_label, rotation=-90, va="bottom")
-
-        # update the slider to show the actual value of the grid point, not the continuous slider value
-        index = indexing_list_indep_vars[cps.get_index_of(param.name)]
-        assert isinstance(index, int) or isinstance(index, np.int64)
-        grid_value = param.np_arr[index]
+        plot_state.indexing_list_indep_vars[cps.get_index_of(param.name)] = nearest_idx
 
-        fig.canvas.draw_idle()
-        # print("updating slider of " + param.name + ", ", val, "updated_ordering_of_params_name_and_value: ", updated_ordering_of_params_name_and_value)
+        plot_state.redraw(cps, fig)
+        # print("updating slider of " + param.name + ", ", val)
 
     def _get_indexing_list_and_ordered_params(self, ordering_of_params_name_and_value):
         """
@@ -319,7 +1206,7 @@ class CParameterSpace:
                 if asked_def_pvalue is not None:
                     # get the closest calculated point to the asked default value
 
-                    nearest_idx = find_nearest_idx(self.get_arr(asked_pname), asked_def_pvalue)
+                    nearest_idx = self.find_nearest_idx(asked_pname, asked_def_pvalue)
                     nearest_val = self.get_arr(asked_pname)[nearest_idx]
                     indexing_list_indep_vars[self.get_index_of(asked_pname)] = nearest_idx
 
@@ -341,15 +1228,144 @@ class CParameterSpace:
 
 
 
-def plot(cps, dep_var_mgf, ordering_of_params_name_and_value=[],
-         fig=None, ax=None, z_label=""):
+def _check_not_flat(cps, what):
+    """ raise for spaces which are a flat list of points (see CSampledParameterSpace):
+    integrals, reductions and plots along a parameter need the axes of a tensor grid """
+    if cps.is_flat:
+        raise TypeError("results on " + type(cps).__name__ + " can't be " + what +
+                        ", it has no grid axes (only a list of points)")
+
+
+class CResult:
+    def __init__(self, data, cps):
+        """ a result array together with the CParameterSpace of its axes, so that
+        reductions can be done by parameter name, without tracking by hand
+        which axes are left (as with reduced_dimensions_indices)
+
+        Args:
+            data: array of shape cps.get_shape() (may be a np.memmap)
+            cps: CParameterSpace whose parameters are the axes of data, in order
+        """
+        _check_not_flat(cps, "reduced by parameter")
+        if np.shape(data) != cps.get_shape():
+            raise ValueError("data has shape " + str(np.shape(data)) + ", but the space has shape " + str(cps.get_shape()))
+
+        self.data = data
+        self.cps = cps
+
+    def get_param_names(self):
+        """ """
+        return self.cps.get_param_names()
+
+    def _get_axes(self, param_names):
+        """ """
+        return tuple(self.cps.get_index_of(name) for name in param_names)
+
+    def _reduced(self, data, param_names):
+        """ a CResult of data over the space without the given parameters """
+        remaining = [cp for cp in self.cps.cparams_list if cp.name not in param_names]
+        return CResult(_apply_storage_dtype(data, self.cps.dtype),
+                       CParameterSpace(remaining, sparse=True, dtype=self.cps.dtype,
+                                       accumulator_dtype=self.cps.accumulator_dtype))
+
+    def _get_accumulator_x(self, name):
+        """ the x values of a parameter in the accumulator dtype; the integrands are
+        promoted to it element by element, so that integrals accumulate in that precision """
+        return np.asarray(self.cps.get_arr(name), dtype=self.cps.accumulator_dtype)
+
+    def trapz(self, *param_names):
+        """ integrate over the given parameters (trapezoidal rule) """
+        data = self.data
+        # integrate the last axes first, so that the axis numbers of the others stay valid
+        for name in sorted(param_names, key=self.cps.get_index_of, reverse=True):
+            data = np.trapz(data, x=self._get_accumulator_x(name), axis=self.cps.get_index_of(name))
+        return self._reduced(data, param_names)
+
+    def simpson(self, *param_names):
+        """ integrate over the given parameters (scipy.integrate.simpson) """
+        from scipy.integrate import simpson
+
+        data = self.data
+        for name in sorted(param_names, key=self.cps.get_index_of, reverse=True):
+            data = simpson(data, x=self._get_accumulator_x(name), axis=self.cps.get_index_of(name))
+        return self._reduced(data, param_names)
+
+    def cumtrapz(self, param_name):
+        """ cumulative integral along a parameter (starting at 0), the space stays the same """
+        from scipy.integrate import cumulative_trapezoid
+
+        return CResult(_apply_storage_dtype(cumulative_trapezoid(self.data, x=self._get_accumulator_x(param_name),
+                                                                 axis=self.cps.get_index_of(param_name), initial=0),
+                                            self.cps.dtype),
+                       self.cps)
+
+    def min(self, *param_names):
+        """ """
+        return self._reduced(np.min(self.data, axis=self._get_axes(param_names)), param_names)
+
+    def max(self, *param_names):
+        """ """
+        return self._reduced(np.max(self.data, axis=self._get_axes(param_names)), param_names)
+
+    def mean(self, *param_names):
+        """ """
+        return self._reduced(np.mean(self.data, axis=self._get_axes(param_names),
+                                     dtype=get_accumulator_dtype(self.data.dtype, self.cps.accumulator_dtype)),
+                             param_names)
+
+    def isel(self, params_names_and_selections):
+        """ view of the result on a subspace selected by index, see CParameterSpace.isel """
+        subspace, index = self.cps.isel(params_names_and_selections)
+        return CResult(self.data[index], subspace)
+
+    def sel(self, params_names_and_selections):
+        """ view of the result on a subspace selected by value, see CParameterSpace.sel """
+        subspace, index = self.cps.sel(params_names_and_selections)
+        return CResult(self.data[index], subspace)
+
+    def argmin(self, param_name):
+        """ the value of the parameter at which the minimum along its axis is
+        attained, as a function of the remaining parameters """
+        idx = np.argmin(self.data, axis=self.cps.get_index_of(param_name))
+        return self._reduced(np.asarray(self.cps.get_arr(param_name))[idx], (param_name,))
+
+    def plot(self, **plot_kwargs):
+        """ see plot """
+        return plot(self, **plot_kwargs)
+
+    def export_frames(self, path, **kwargs):
+        """ see cparameterspace_export.export_frames """
+        from ctsutils.cparameterspace_export import export_frames
+        return export_frames(self, path=path, **kwargs)
+
+
+@_profiled("plot")
+def plot(cps, dep_var_mgf=None, ordering_of_params_name_and_value=[],
+         fig=None, ax=None, z_label="", update_clim=True, slice_cache_size=None, prefetch=True,
+         render_method="auto", lod=True, sliders=True):
     """
     Args:
         ordering_of_params_name_and_value: list of tuples (param name, default value)
                             the frist two independent parameters appear on x and y axes of the color plot
                             the others (if specified) appear as sliders in the specified order.
+        cps, dep_var_mgf: instead of both, a CResult can be passed as cps
+        update_clim: if True, the color limits are adjusted to the shown slice when a slider moves
+        slice_cache_size: if given, keep up to that many shown slices in a CSliceCache
+        prefetch: with a slice cache, load the neighboring slices of the slider positions in the background
+        render_method: "auto" (imshow if both axes are uniformly spaced, pcolormesh otherwise),
+                       "imshow" or "pcolormesh", see CSliceRenderer
+        lod: draw slices with more cells than pixels decimated to the resolution of the axes
+             (min/max preserving), and redraw in more detail when zooming in
+        sliders: if False, no sliders are made (e.g. for figures without pyplot, see export_frames);
+                 the slices of the other parameters can still be chosen through the CPlotState
+    Returns:
+        the CPlotState of the color plot (None for 1-D plots)
     """
 
+    if isinstance(cps, CResult):
+        cps, dep_var_mgf = cps.cps, cps.data
+    _check_not_flat(cps, "plotted")
+
     if ax is None:
         ax = plt.gca()
 
@@ -357,57 +1373,382 @@ def plot(cps, dep_var_mgf, ordering_of_params_name_and_value=[],
         fig = plt.gcf()
 
     if cps.get_dimension() == 1:
-        ax.plot(dep_var_mgf[:],  # just one dimension, i.e. take all independent values of that dimension
-                # if there is only one parameter, it must have index 0
-                cps.get_arr(0),
+        # if there is only one parameter, it must have index 0
+        ax.plot(cps.cparams_list[0].np_arr,
+                dep_var_mgf[:],  # just one dimension, i.e. take all independent values of that dimension
                 "k-")
+        ax.set_xlabel(cps.cparams_list[0].get_label_str())
+        ax.set_ylabel(z_label)
     elif cps.get_dimension() >= 2.:
         # make color plot with cps.get_dimension() - 2 sliders below to vary the other parameters
         # this contains in the end an expression like [:, :, :, 2, :] (where ":" is equivalent to slice(None))
 
         indexing_list_indep_vars, ordered_params = cps._get_indexing_list_and_ordered_params(ordering_of_params_name_and_value)
 
-        # if there are more than 2 dimensions (free parameters), plot sliders for the values of the other dimensions
-        cps._make_sliders(indexing_list_indep_vars, ordered_params, ordering_of_params_name_and_value, dep_var_mgf, fig, ax)
-
         # plot X, Y, Z data, where X, Y, Z must have the same np.shape() tuple (2d tuple!)
-        X, Y, Z = shape_arrays_for_pcolor_plotting(cps, indexing_list_indep_vars, ordered_params, dep_var_mgf)
+        # X, Y are computed only here, slider movements only exchange Z
+        with _stage("slice"):
+            X, Y, Z = shape_arrays_for_pcolor_plotting(cps, indexing_list_indep_vars, ordered_params, dep_var_mgf)
 
         assert np.shape(X) == np.shape(Y) == np.shape(Z) and len(np.shape(X)) == 2
-        c = ax.pcolor(X, Y, Z, # shading="auto"
-        )
-        cbar = fig.colorbar(c, ax=ax)
-        cbar.ax.set_ylabel(z_label, rotation=-90, va="bottom")
+        # an AxesImage or a QuadMesh (unlike the PolyCollection of pcolor) can take a new 2-D data array as it is
+        renderer = CSliceRenderer(ax, ordered_params[0].np_arr, ordered_params[1].np_arr,
+                                  cps.get_index_of(ordered_params[0].name) < cps.get_index_of(ordered_params[1].name),
+                                  method=render_method, lod=lod)
+        with _stage("render"):
+            if renderer.lod:
+                # fix the limits to the whole slice first, the decimation depends on them
+                ax.set_xlim(renderer.x_edges[0], renderer.x_edges[-1])
+                ax.set_ylim(renderer.y_edges[0], renderer.y_edges[-1])
+            c = renderer.show(Z, X, Y)
+            if update_clim and np.any(np.isfinite(Z)):
+                c.set_clim(np.nanmin(Z), np.nanmax(Z))
+            cbar = fig.colorbar(c, ax=ax)
+            cbar.ax.set_ylabel(z_label, rotation=-90, va="bottom")
+            renderer.colorbar = cbar
 
         ax.set_xlabel(ordered_params[0].get_label_str())
         ax.set_ylabel(ordered_params[1].get_label_str())
 
+        slice_cache = None
+        if slice_cache_size is not None:
+            slice_cache = CSliceCache(cps, dep_var_mgf, np.shape(X), max_slices=slice_cache_size, prefetch=prefetch)
+
+        plot_state = CPlotState(c, indexing_list_indep_vars, ordered_params, dep_var_mgf, np.shape(X),
+                                update_clim=update_clim, slice_cache=slice_cache, renderer=renderer)
+        plot_state._z = Z
+
+        if renderer.lod:
+            # zooming -> show the visible part of the slice in more detail
+            ax.callbacks.connect("xlim_changed", lambda ax: plot_state.redraw(cps, fig, refetch=False))
+            ax.callbacks.connect("ylim_changed", lambda ax: plot_state.redraw(cps, fig, refetch=False))
+        if slice_cache is not None:
+            # don't leave the prefetching thread behind when the figure is closed
+            fig.canvas.mpl_connect("close_event", lambda event: slice_cache.close())
+            slice_cache.prefetch_neighbors(indexing_list_indep_vars)
+
+        # if there are more than 2 dimensions (free parameters), plot sliders for the values of the other dimensions
+        if sliders:
+            with _stage("sliders"):
+                cps._make_sliders(indexing_list_indep_vars, ordered_params, plot_state, fig, ax)
 
+        return plot_state
+
+
+@_profiled("calc_integral")
 def calc_integral(cps, dep_var_mgf,
-                  param_to_integrate_over_name):
+                  param_to_integrate_over_name, max_block_bytes=None, out=None,
+                  dtype=None, accumulator_dtype=None):
     """
     Args:
         dep_var_mgf: these are the actual y values
         param_to_integrate_over: name of param to integrate over -> x values
+        max_block_bytes: if given (or if dep_var_mgf is a np.memmap), integrate block by block,
+                         each block spanning the whole integration axis, so that dep_var_mgf
+                         is never loaded into memory as a whole
+        out: see open_result_array
+        dtype: storage dtype policy of the result (default: cps.dtype, see get_storage_dtype)
+        accumulator_dtype: dtype the integral accumulates in (default: cps.accumulator_dtype),
+                           also if dep_var_mgf is stored with a lower precision
     """
+    _check_not_flat(cps, "integrated")
+    if dtype is None:
+        dtype = cps.dtype
+    if accumulator_dtype is None:
+        accumulator_dtype = cps.accumulator_dtype
 
-    return np.trapz(dep_var_mgf,
-                    x=cps.get_arr(param_to_integrate_over_name),
-                    axis=cps.get_index_of(param_to_integrate_over_name))
+    # the y values are promoted to the dtype of x element by element inside trapz
+    x = np.asarray(cps.get_arr(param_to_integrate_over_name), dtype=accumulator_dtype)
+    axis = cps.get_index_of(param_to_integrate_over_name)
 
+    if max_block_bytes is None and out is None and not isinstance(dep_var_mgf, np.memmap):
+        with _stage("trapz"):
+            return _apply_storage_dtype(np.trapz(dep_var_mgf, x=x, axis=axis), dtype)
 
-def calc_function(cps, f, args_param_names=()):
-    """ """
-    if len(args_param_names) == 0:
+    if max_block_bytes is None:
+        max_block_bytes = DEFAULT_MAX_BLOCK_BYTES
+
+    shape = np.shape(dep_var_mgf)
+    other_axes = [ax for ax in range(len(shape)) if ax != axis]
+    result = None
+    for index_slices in get_block_slices(shape, max_block_bytes, block_axes=other_axes,
+                                         itemsize=dep_var_mgf.dtype.itemsize):
+        with _stage("trapz"):
+            block_result = np.trapz(dep_var_mgf[index_slices], x=x, axis=axis)
+        if result is None:
+            result = open_result_array(out, shape[:axis] + shape[axis + 1:],
+                                       get_storage_dtype(dtype, block_result.dtype))
+        result[index_slices[:axis] + index_slices[axis + 1:]] = block_result
+
+    return result
+
+
+def open_result_array(out, shape, dtype):
+    """ the array a result is written into
+
+    Args:
+        out: None (-> a new in-memory array), an existing array of the right shape
+             (e.g. a np.memmap), or the path of a .npy file, which is then created
+             and opened as a memmap, to hold results larger than the memory
+    """
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+
+    if isinstance(out, (str, os.PathLike)):
+        return np.lib.format.open_memmap(out, mode="w+", dtype=dtype, shape=tuple(shape))
+
+    if np.shape(out) != tuple(shape):
+        raise ValueError("out has shape " + str(np.shape(out)) + ", expected " + str(tuple(shape)))
+
+    return out
+
+
+def get_block_slices(shape, max_block_bytes, block_axes=None, itemsize=8):
+    """ split a grid of the given shape into blocks of at most max_block_bytes
+
+    Args:
+        shape: shape of the full grid
+        max_block_bytes: memory budget of one block (of one array with the given itemsize)
+        block_axes: axes along which the grid may be split, in the order in which they
+                    are split (default: all axes, outermost first, so that the blocks
+                    are contiguous in C order)
+        itemsize: bytes per grid point
+    Returns:
+        list of tuples of slices, one tuple per block
+    """
+    if block_axes is None:
+        block_axes = range(len(shape))
+
+    block_shape = list(shape)
+    for ax in block_axes:
+        bytes_per_unit = itemsize * int(np.prod(block_shape)) // max(block_shape[ax], 1)
+        n = max_block_bytes // max(bytes_per_unit, 1)
+        if n >= 1:
+            block_shape[ax] = min(int(n), shape[ax])
+            break
+        block_shape[ax] = 1  # a single slab along ax is still too large -> also split the next axis
+
+    ranges_per_axis = [[slice(start, min(start + step, n)) for start in range(0, n, step)] if n > 0 else [slice(None)]
+                       for n, step in zip(shape, block_shape)]
+    return list(itertools.product(*ranges_per_axis))
+
+
+def _get_meshgridified_arrays(cps, args_param_names, index_slices=None):
+    """ the (possibly sparse) meshgrid arrays of the given parameters, optionally restricted to a block """
+    meshgridifed_arrays = [cps.get_mgf_arr(name) for name in args_param_names]
+
+    # check that all shapes broadcast against each other. only then they can be processed correctly by numpy
+    # (in dense mode they are all equal, in sparse mode they are of shape (1, ..., N_i, ..., 1))
+    np.broadcast_shapes(*[np.shape(arr) for arr in meshgridifed_arrays])
+
+    if index_slices is not None:
+        # sparse arrays have length 1 along the other parameters' axes -> don't slice those
+        meshgridifed_arrays = [arr[tuple(sl if np.shape(arr)[ax] != 1 else slice(None)
+                                         for ax, sl in enumerate(index_slices))]
+                               for arr in meshgridifed_arrays]
+
+    return meshgridifed_arrays
+
+
+def iter_calc_function_blocks(cps, f, args_param_names=(), max_block_bytes=DEFAULT_MAX_BLOCK_BYTES, block_axes=None, itemsize=8):
+    """ evaluate f block by block on the grid, e.g. to stream the results to disk
+    or into a reduction, without ever having the full result in memory.
+
+    Args:
+        max_block_bytes, block_axes, itemsize: see get_block_slices
+    Yields:
+        (index_slices, block_result): block_result has the shape of the grid restricted
+                                      to index_slices, i.e. out[index_slices] = block_result
+    """
+    for index_slices in get_block_slices(cps.get_shape(), max_block_bytes, block_axes=block_axes, itemsize=itemsize):
+        block_shape = tuple(len(range(*sl.indices(n))) for sl, n in zip(index_slices, cps.get_shape()))
+        block_result = f(*_get_meshgridified_arrays(cps, args_param_names, index_slices))
+        yield index_slices, np.broadcast_to(block_result, block_shape)
+
+
+@_profiled("calc_function")
+def calc_function(cps, f, args_param_names=(), max_block_bytes=None, block_axes=None,
+                  n_workers=None, per_point=False, cache=None, out=None, backend=None, dtype=None):
+    """
+    Args:
+        f: function of the meshgrid arrays of args_param_names, or an expression string
+           over parameter names, e.g. "(1 - a/2 + a**5) * exp(-a**2 - b**2)", which is
+           evaluated in cache-sized blocks with fused temporaries
+           (see cparameterspace_expr.calc_expression; args_param_names are then optional)
+        max_block_bytes: if given, f is evaluated tile by tile (see iter_calc_function_blocks),
+                         each tile's result is written into one preallocated output array.
+                         This bounds the memory of the temporaries numpy creates inside f.
+        block_axes: axes along which the grid may be split (see get_block_slices)
+        n_workers: if given, the tiles are evaluated by that many worker processes
+                   (see cparameterspace_parallel.calc_function_parallel)
+        per_point: if True, f takes scalars and is called once per grid point
+        cache: a cparameterspace_cache.CResultCache, to look the result up on disk
+               instead of recomputing it
+        out: array or path of a .npy file to write the result into (see open_result_array);
+             with a np.memmap / path, f is evaluated tile by tile and the result
+             never needs to fit into memory as a whole
+        backend: for an expression string: "numexpr", "numpy" or None (numexpr, if installed);
+                 n_workers is then the number of threads
+        dtype: storage dtype policy of the result (default: cps.dtype, see get_storage_dtype),
+               e.g. np.float32 or np.complex64
+    """
+    if len(args_param_names) == 0 and not isinstance(f, str):
         print("nothing sampled!")
         return None
 
-    # check that all shapes are equal. only then they can be processed correctly by numpy
-    shapes = np.array([np.shape(cps.get_mgf_arr(name)) for name in args_param_names])
-    assert (shapes == shapes[0]).all()
+    if dtype is None:
+        dtype = cps.dtype
+
+    if cache is not None:
+        return cache.calc_function(cps, f, args_param_names,
+                                   max_block_bytes=max_block_bytes, block_axes=block_axes,
+                                   n_workers=n_workers, per_point=per_point, out=out, backend=backend,
+                                   dtype=dtype)
+
+    if isinstance(f, str):
+        from ctsutils.cparameterspace_expr import calc_expression
+        return calc_expression(cps, f, args_param_names, n_threads=n_workers, backend=backend,
+                               max_block_bytes=max_block_bytes, block_axes=block_axes, out=out, dtype=dtype)
+
+    if n_workers is not None or per_point:
+        from ctsutils.cparameterspace_parallel import calc_function_parallel
+        return calc_function_parallel(cps, f, args_param_names,
+                                      n_workers=1 if n_workers is None else n_workers,
+                                      per_point=per_point,
+                                      max_block_bytes=max_block_bytes, block_axes=block_axes, out=out,
+                                      dtype=dtype)
+
+    if max_block_bytes is not None or out is not None:
+        if max_block_bytes is None:
+            max_block_bytes = DEFAULT_MAX_BLOCK_BYTES
+
+        result = None
+        with _stage("tiles"):
+            for index_slices, block_result in iter_calc_function_blocks(cps, f, args_param_names,
+                                                                        max_block_bytes=max_block_bytes,
+                                                                        block_axes=block_axes):
+                if result is None:
+                    result = open_result_array(out, cps.get_shape(), get_storage_dtype(dtype, block_result.dtype))
+                result[index_slices] = block_result
+
+        if isinstance(result, np.memmap):
+            result.flush()
+        return result
+
+    with _stage("meshgrid_arrays"):
+        meshgridified_arrays = _get_meshgridified_arrays(cps, args_param_names)
+    with _stage("f"):
+        result = f(*meshgridified_arrays)
+    result = _apply_storage_dtype(result, dtype)
+
+    if cps.sparse and np.shape(result) != cps.get_shape():
+        # e.g. f depends on only some of the parameters -> expand (without copying)
+        # to the full grid shape, so that calc_integral, plot etc. work as in dense mode
+        result = np.broadcast_to(result, cps.get_shape())
+
+    return result
+
+def _take_along(arr, axis, index):
+    """ arr[..., index, ...] with index applied to the given axis """
+    return arr[(slice(None),) * axis + (index,)]
+
+
+@_profiled("calc_function_reduced")
+def calc_function_reduced(cps, f, args_param_names, param_to_reduce_over_name, reduction="trapz",
+                          max_block_bytes=None, dtype=None, accumulator_dtype=None):
+    """ fused calc_function and reduction over one parameter: f is evaluated in slabs
+    along that parameter's axis and the reduction is accumulated slab by slab, so the
+    full grid never exists in memory. The result equals e.g.
+    calc_integral(cps, calc_function(cps, f, args_param_names), param_to_reduce_over_name).
 
-    meshgridifed_arrays = [cps.get_mgf_arr(name) for name in args_param_names]
-    return f(*meshgridifed_arrays)
+    Args:
+        reduction: "trapz", "simpson" (scipy.integrate.simpson), "sum", "mean", "min" or "max"
+        max_block_bytes: memory budget of one slab (default: REDUCED_BLOCK_SLICES slices,
+                         a slice having the size of the reduced result; at least one slice)
+        dtype: storage dtype policy of the result (default: cps.dtype, see get_storage_dtype)
+        accumulator_dtype: dtype the reduction accumulates in (default: cps.accumulator_dtype)
+    Returns:
+        array of the grid's shape without the reduced axis
+    """
+    assert reduction in ("trapz", "simpson", "sum", "mean", "min", "max")
+    _check_not_flat(cps, "reduced")
+
+    if dtype is None:
+        dtype = cps.dtype
+    if accumulator_dtype is None:
+        accumulator_dtype = cps.accumulator_dtype
+
+    x = np.asarray(cps.get_arr(param_to_reduce_over_name), dtype=accumulator_dtype)
+    axis = cps.get_index_of(param_to_reduce_over_name)
+
+    if max_block_bytes is None:
+        # float64 slices, as iter_calc_function_blocks counts them
+        shape = cps.get_shape()
+        max_block_bytes = REDUCED_BLOCK_SLICES * int(np.prod(shape[:axis] + shape[axis + 1:])) * 8
+    n = np.size(x)
+
+    if reduction == "simpson":
+        from scipy.integrate import simpson
+
+    acc = None
+    carry = None  # trailing points of the previous slab, which the next one connects to
+    carry_start = 0
+    for index_slices, y in iter_calc_function_blocks(cps, f, args_param_names, max_block_bytes=max_block_bytes,
+                                                    block_axes=[axis]):
+        start, stop, _ = index_slices[axis].indices(n)
+        if reduction not in ("min", "max"):
+            y = y.astype(get_accumulator_dtype(y.dtype, accumulator_dtype), copy=False)
+
+        if reduction == "trapz":
+            block_acc = np.trapz(y, x=x[start:stop], axis=axis)
+            if carry is not None:
+                # the interval between the last point of the previous slab and the first of this one
+                block_acc = block_acc + (x[start] - x[start - 1]) * (carry + _take_along(y, axis, 0)) / 2.
+            carry = _take_along(y, axis, -1)
+        elif reduction == "simpson":
+            # composite simpson works on pairs of intervals: only integrate an odd number
+            # of points of each slab and carry the rest over to the next slab,
+            # so that the panels are the same as when integrating the whole axis at once
+            buf = y if carry is None else np.concatenate([carry, y], axis=axis)
+            buf_start = start if carry is None else carry_start
+            n_buf = np.shape(buf)[axis]
+            if stop == n:
+                n_integrate = n_buf
+            else:
+                # keep at least 3 points back: with an even number of points, simpson treats
+                # the last interval with the 3 last points, so the last buffer needs them
+                n_integrate = n_buf - 2 if n_buf % 2 == 1 else n_buf - 3
+                if n_integrate < 3:
+                    n_integrate = 1  # nothing to integrate yet
+
+            block_acc = None
+            if n_integrate >= 2:
+                block_acc = simpson(_take_along(buf, axis, slice(0, n_integrate)),
+                                    x=x[buf_start:buf_start + n_integrate], axis=axis)
+            carry = _take_along(buf, axis, slice(max(n_integrate - 1, 0), n_buf))
+            carry_start = buf_start + max(n_integrate - 1, 0)
+            if block_acc is None:
+                continue
+        elif reduction in ("sum", "mean"):
+            block_acc = np.sum(y, axis=axis)
+        elif reduction == "min":
+            block_acc = np.min(y, axis=axis)
+        elif reduction == "max":
+            block_acc = np.max(y, axis=axis)
+
+        if acc is None:
+            acc = np.array(block_acc)
+        elif reduction == "min":
+            np.minimum(acc, block_acc, out=acc)
+        elif reduction == "max":
+            np.maximum(acc, block_acc, out=acc)
+        else:
+            acc = acc + block_acc
+
+    if reduction == "mean":
+        acc = acc / n
+
+    return _apply_storage_dtype(acc, dtype)
 
 def tuple_pull_to_front(orig_tuple, *tuple_keys_to_pull_to_front):
     """
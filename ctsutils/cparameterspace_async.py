@@ -0,0 +1,237 @@
+import numpy as np
+import itertools
+import threading
+import asyncio
+from concurrent.futures import Future, CancelledError
+
+from ctsutils.cparameterspace import (plot, get_block_slices, open_result_array, get_storage_dtype,
+                                      _apply_storage_dtype, DEFAULT_MAX_BLOCK_BYTES)
+
+
+def _get_strides(coarse_stride):
+    """ coarse_stride, coarse_stride / 2, ..., 1 """
+    strides = [1]
+    while strides[-1] * 2 <= coarse_stride:
+        strides.append(strides[-1] * 2)
+    return strides[::-1]
+
+
+def _get_strided_shape(shape, stride):
+    """ shape of the grid restricted to every stride-th point along each axis """
+    return tuple(-(-n // stride) for n in shape)
+
+
+def _fill_strided_blocks(target, values, stride):
+    """ write each value into the stride^d block of target it is the corner of
+    (the blocks at the end may be cut off), through views of target split into
+    (blocks, stride) along each axis, without materializing the repeated values """
+    # per axis: the whole blocks, and the cut off block at the end
+    parts_per_axis = []
+    for n in np.shape(target):
+        n_whole = n // stride
+        parts = [(slice(0, n_whole * stride), slice(0, n_whole), n_whole, stride)]
+        if n % stride:
+            parts.append((slice(n_whole * stride, n), slice(n_whole, n_whole + 1), 1, n % stride))
+        parts_per_axis.append(parts)
+
+    for parts in itertools.product(*parts_per_axis):
+        if any(n_blocks == 0 for _, _, n_blocks, _ in parts):
+            continue
+        region = target[tuple(part[0] for part in parts)].view()
+        # setting the shape raises instead of copying, so the writes always reach target
+        region.shape = tuple(itertools.chain.from_iterable((n_blocks, width) for _, _, n_blocks, width in parts))
+        block_values = values[tuple(part[1] for part in parts)]
+        region[...] = block_values[tuple(itertools.chain.from_iterable((slice(None), None) for _ in parts))]
+
+
+class CProgressiveResult:
+    def __init__(self, cps, f, args_param_names, coarse_stride=8, max_block_bytes=None, dtype=None, out=None):
+        """ handle of a calc_function evaluation running in a background thread,
+        see calc_function_progressive """
+        self.cps = cps
+        self.strides = _get_strides(coarse_stride)
+        self.max_block_bytes = DEFAULT_MAX_BLOCK_BYTES if max_block_bytes is None else max_block_bytes
+
+        if isinstance(f, str):
+            from ctsutils.cparameterspace_expr import CExpression
+            f = CExpression(f, cps.get_param_names())
+            args_param_names = f.args_param_names
+        self.f = f
+        self.args_param_names = list(args_param_names)
+
+        if dtype is None:
+            dtype = cps.dtype
+        self._axes_arrays = [_apply_storage_dtype(cp.np_arr, dtype) for cp in cps.cparams_list]
+        self._arg_positions = [cps.get_index_of(name) for name in self.args_param_names]
+
+        # the dtype of the result follows from its value at the first grid point
+        first_point = self._evaluate([arr[:1] for arr in self._axes_arrays])
+        # (filled with NaN in the background thread, which for a large out file takes a while)
+        self.array = open_result_array(out, cps.get_shape(), get_storage_dtype(dtype, np.result_type(first_point)))
+
+        self.n_points_total = sum(int(np.prod(_get_strided_shape(cps.get_shape(), stride))) for stride in self.strides)
+        self.n_points_done = 0
+        self.n_tiles_done = 0
+        self.stride = None  # stride of the level being evaluated
+
+        self._tile_callbacks = []
+        self._cancel_event = threading.Event()
+        self._future = Future()
+        self._future.set_running_or_notify_cancel()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _evaluate(self, block_axes_arrays):
+        """ f on the grid spanned by the given 1-D arrays of all parameters """
+        if self.cps.is_flat:
+            args = block_axes_arrays
+            shape = np.shape(block_axes_arrays[0])
+        else:
+            args = np.meshgrid(*block_axes_arrays, indexing="ij", sparse=True)
+            shape = tuple(np.size(arr) for arr in block_axes_arrays)
+        return np.broadcast_to(self.f(*[args[p] for p in self._arg_positions]), shape)
+
+    def _evaluate_tile(self, stride, index_slices):
+        """ evaluate one tile of the level with the given stride; index_slices are indices
+        into the strided grid. Until the next level arrives, each computed point also stands
+        in for the stride^d block of points it is the corner of, so that the plot shows
+        a coarse picture of the whole result early. """
+        grid_slices = tuple(slice(sl.start * stride, sl.stop * stride) for sl in index_slices)
+        if self.cps.is_flat:
+            block_axes_arrays = [arr[grid_slices[0]][::stride] for arr in self._axes_arrays]
+        else:
+            block_axes_arrays = [arr[sl][::stride] for arr, sl in zip(self._axes_arrays, grid_slices)]
+        values = self._evaluate(block_axes_arrays)
+
+        if stride == 1:
+            self.array[grid_slices] = values
+        else:
+            _fill_strided_blocks(self.array[grid_slices], values, stride)
+
+    def _run(self):
+        """ """
+        try:
+            if self.array.dtype.kind in "fc":
+                # NaN marks what isn't known yet; block by block, so that it can be cancelled
+                for index_slices in get_block_slices(self.cps.get_shape(), self.max_block_bytes,
+                                                     itemsize=self.array.dtype.itemsize):
+                    if self._cancel_event.is_set():
+                        self._future.set_exception(CancelledError())
+                        return
+                    self.array[index_slices] = np.nan
+
+            for stride in self.strides:
+                self.stride = stride
+                strided_shape = _get_strided_shape(self.cps.get_shape(), stride)
+                # the budget is for the block of the grid a tile fills, each of its points fills stride^d
+                for index_slices in get_block_slices(strided_shape, self.max_block_bytes,
+                                                     itemsize=self.array.dtype.itemsize * stride ** len(strided_shape)):
+                    if self._cancel_event.is_set():
+                        self._future.set_exception(CancelledError())
+                        return
+
+                    index_slices = tuple(slice(*sl.indices(n)[:2]) for sl, n in zip(index_slices, strided_shape))
+                    self._evaluate_tile(stride, index_slices)
+
+                    self.n_points_done += int(np.prod([sl.stop - sl.start for sl in index_slices]))
+                    self.n_tiles_done += 1
+                    for callback in list(self._tile_callbacks):
+                        callback(self)
+
+            if isinstance(self.array, np.memmap):
+                self.array.flush()
+            self._future.set_result(self.array)
+        except BaseException as e:
+            self._future.set_exception(e)
+
+    def get_progress(self):
+        """ fraction of the evaluations done, between 0 and 1 """
+        return self.n_points_done / max(self.n_points_total, 1)
+
+    def done(self):
+        """ """
+        return self._future.done()
+
+    def cancel(self):
+        """ stop after the tile being evaluated; result() then raises CancelledError """
+        self._cancel_event.set()
+
+    def cancelled(self):
+        """ """
+        return self._future.done() and isinstance(self._future.exception(), CancelledError)
+
+    def result(self, timeout=None):
+        """ wait for the evaluation and return the full result array """
+        return self._future.result(timeout=timeout)
+
+    def add_done_callback(self, fn):
+        """ fn(future) is called when the evaluation finishes, fails or is cancelled
+        (see concurrent.futures.Future.add_done_callback) """
+        self._future.add_done_callback(fn)
+
+    def add_tile_callback(self, fn):
+        """ fn(self) is called from the background thread after each tile """
+        self._tile_callbacks.append(fn)
+
+    def __await__(self):
+        """ await the result from asyncio """
+        return asyncio.wrap_future(self._future).__await__()
+
+    def plot(self, interval=200, **plot_kwargs):
+        """ plot the result while it is evaluated; the current slice is redrawn from
+        a timer of the figure's canvas (i.e. in the GUI thread), as long as new tiles arrive
+
+        Args:
+            interval: ms between checks for new tiles
+            plot_kwargs: see plot (a slice cache can't be used, as the data changes)
+        Returns:
+            the CPlotState of the plot
+        """
+        plot_kwargs.pop("slice_cache_size", None)
+        plot_state = plot(self.cps, self.array, **plot_kwargs)
+        if plot_state is None:
+            return None
+
+        fig = plot_state.mesh.figure
+        timer = fig.canvas.new_timer(interval=interval)
+        n_tiles_shown = [self.n_tiles_done]
+
+        def on_timer():
+            finished = self.done()
+            if self.n_tiles_done != n_tiles_shown[0] or finished:
+                n_tiles_shown[0] = self.n_tiles_done
+                plot_state.redraw(self.cps, fig)
+            if finished:
+                timer.stop()
+
+        timer.add_callback(on_timer)
+        timer.start()
+        plot_state.refresh_timer = timer  # keep a reference, else the timer may be garbage collected
+        return plot_state
+
+
+def calc_function_progressive(cps, f, args_param_names=(), coarse_stride=8, max_block_bytes=None,
+                              dtype=None, out=None):
+    """ start evaluating f on the grid in a background thread and return at once. The
+    result array is filled in levels: first every coarse_stride-th point along each axis
+    (each standing in for the block of points around it), then every coarse_stride/2-th,
+    ..., down to every point. Within a level, the grid is evaluated tile by tile.
+    Points of a coarser level are evaluated again on the finer ones (a fraction 2^-d
+    of each level, for d parameters).
+
+    Args:
+        f: vectorized function of args_param_names, or an expression string (see cparameterspace_expr)
+        coarse_stride: stride of the first level (rounded down to a power of 2), 1 for no coarse levels
+        max_block_bytes: memory budget of one tile (default: DEFAULT_MAX_BLOCK_BYTES);
+                         smaller tiles give more frequent updates
+        dtype: storage dtype policy of the result (default: cps.dtype, see get_storage_dtype)
+        out: array or path of a .npy file to fill (see open_result_array)
+    Returns:
+        CProgressiveResult: its array attribute is the result array, filled while the
+        evaluation runs (NaN where nothing is known yet, for floating point results; the
+        NaN are written by the background thread too, so the array may hold other values
+        for a moment after the call returns);
+        use result(), await, done(), cancel(), get_progress() and plot() on it
+    """
+    return CProgressiveResult(cps, f, args_param_names, coarse_stride=coarse_stride,
+                              max_block_bytes=max_block_bytes, dtype=dtype, out=out)
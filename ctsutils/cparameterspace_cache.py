@@ -0,0 +1,255 @@
+import numpy as np
+import os
+import hashlib
+import pickle
+import functools
+import tempfile
+import types
+
+from ctsutils.cparameterspace import calc_function, open_result_array
+
+
+def _update_hash_with_value(h, value, seen):
+    """ feed a value captured by a function (closure cell, default, global) into the hash """
+    if isinstance(value, np.ndarray):
+        h.update(str((value.dtype.str, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif hasattr(value, "__code__") or isinstance(value, functools.partial):
+        _update_hash_with_function(h, value, seen)
+    elif isinstance(value, (types.ModuleType, type)):
+        h.update(repr(value).encode())
+    else:
+        try:
+            h.update(pickle.dumps(value, protocol=4))
+        except Exception:
+            if id(value) in seen:  # objects referring to each other
+                h.update(b"<seen>")
+                return
+            seen.add(id(value))
+            _update_hash_with_state(h, value, seen)
+
+
+def _update_hash_with_state(h, obj, seen):
+    """ feed an object which can't be pickled into the hash by its type and attributes;
+    a repr (which usually contains the memory address) would never match across sessions """
+    if not hasattr(obj, "__dict__"):
+        raise TypeError("can't fingerprint " + type(obj).__name__ + " object " +
+                        "(neither picklable nor with a __dict__), so it can't be part of a cache key") from None
+    h.update((type(obj).__module__ + "." + type(obj).__qualname__).encode())
+    for key, value in sorted(vars(obj).items()):
+        h.update(key.encode())
+        _update_hash_with_value(h, value, seen)
+
+
+def _update_hash_with_code(h, code):
+    """ """
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode())
+    h.update(repr(code.co_varnames).encode())
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):  # nested functions, lambdas, comprehensions
+            _update_hash_with_code(h, const)
+        else:
+            h.update(repr(const).encode())
+
+
+def _update_hash_with_function(h, f, seen):
+    """ fingerprint of a function: its code object, closure values, defaults and
+    the globals it refers to (recursively for functions it calls) """
+    if id(f) in seen:  # recursive functions
+        h.update(b"<seen>")
+        return
+    seen.add(id(f))
+
+    if isinstance(f, functools.partial):
+        _update_hash_with_function(h, f.func, seen)
+        for value in f.args:
+            _update_hash_with_value(h, value, seen)
+        for key in sorted(f.keywords):
+            h.update(key.encode())
+            _update_hash_with_value(h, f.keywords[key], seen)
+        return
+
+    f_self = getattr(f, "__self__", None)
+    if f_self is not None and not isinstance(f_self, types.ModuleType):
+        # a bound method: the result depends on the instance as well
+        # (a builtin function's __self__ is its module)
+        h.update(b"<bound>")
+        _update_hash_with_value(h, f_self, seen)
+        if hasattr(f, "__func__"):
+            _update_hash_with_function(h, f.__func__, seen)
+        else:
+            h.update(repr((type(f_self).__qualname__, f.__name__)).encode())
+        return
+
+    code = getattr(f, "__code__", None)
+    if code is None:
+        if isinstance(f, (np.ufunc, types.BuiltinFunctionType)):
+            h.update(repr(f).encode())
+            return
+        # a callable object: the code of its __call__ and its state
+        h.update((type(f).__module__ + "." + type(f).__qualname__).encode())
+        _update_hash_with_function(h, type(f).__call__, seen)
+        try:
+            h.update(pickle.dumps(f, protocol=4))
+        except Exception:
+            _update_hash_with_state(h, f, seen)
+        return
+
+    h.update(getattr(f, "__qualname__", "").encode())
+    _update_hash_with_code(h, code)
+    for cell in (f.__closure__ or ()):
+        _update_hash_with_value(h, cell.cell_contents, seen)
+    for value in (f.__defaults__ or ()):
+        _update_hash_with_value(h, value, seen)
+
+    f_globals = getattr(f, "__globals__", {})
+    for name in _get_global_names(code):
+        if name in f_globals:
+            h.update(name.encode())
+            _update_hash_with_value(h, f_globals[name], seen)
+
+
+def _get_global_names(code):
+    """ names which may refer to globals, including those of nested code objects """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            names |= _get_global_names(const)
+    return sorted(names)
+
+
+def get_function_fingerprint(f):
+    """ hex digest of the function's code, closure values, defaults and used globals """
+    h = hashlib.sha256()
+    _update_hash_with_function(h, f, set())
+    return h.hexdigest()
+
+
+def get_cache_key(cps, f, args_param_names, dtype=None):
+    """ content address of the result of calc_function(cps, f, args_param_names, dtype=dtype):
+    combines the grid axes (names, array bytes, units), the argument ordering,
+    the storage dtype policy and the function's fingerprint """
+    h = hashlib.sha256()
+    for cp in cps.cparams_list:
+        arr = np.asarray(cp.np_arr)
+        h.update(repr((cp.name, cp.unit, arr.dtype.str, arr.shape)).encode())
+        h.update(np.ascontiguousarray(arr).tobytes())
+    h.update(repr(tuple(args_param_names)).encode())
+    h.update(repr(None if dtype is None else np.dtype(dtype).str).encode())
+    h.update(get_function_fingerprint(f).encode())
+    return h.hexdigest()
+
+
+class CResultCache:
+    def __init__(self, cache_dir, max_bytes=None, mmap_mode=None):
+        """ on-disk cache of calc_function results, one .npy file per result,
+        named by its content address (see get_cache_key).
+
+        Args:
+            cache_dir: directory of the .npy files (created if necessary)
+            max_bytes: if given, the least recently used results are removed
+                       as soon as the cache grows beyond this size
+            mmap_mode: passed to np.load, e.g. "r" to get cached results as read-only
+                       memmaps instead of loading them into memory
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mmap_mode = mmap_mode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _get_path(self, key):
+        """ """
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def _get_entries(self):
+        """ list of (last access time, size, path) of all cached results """
+        entries = []
+        for fname in os.listdir(self.cache_dir):
+            if fname.endswith(".npy"):
+                path = os.path.join(self.cache_dir, fname)
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def get_size(self):
+        """ total size in bytes of all cached results """
+        return sum(size for _, size, _ in self._get_entries())
+
+    def get_stats(self):
+        """ """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._get_entries()), "bytes": self.get_size()}
+
+    def load(self, key):
+        """ the cached result for key, or None """
+        path = self._get_path(key)
+        try:
+            result = np.load(path, mmap_mode=self.mmap_mode)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        os.utime(path)  # the modification time marks the last access (for LRU eviction)
+        self.hits += 1
+        return result
+
+    def store(self, key, result):
+        """ """
+        # write to a temporary file first, so that an interrupted write never leaves a broken entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.save(fh, result)
+            os.replace(tmp_path, self._get_path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        """ remove the least recently used results until the cache fits into max_bytes """
+        if self.max_bytes is None:
+            return
+
+        entries = sorted(self._get_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+
+    def invalidate(self, cps, f, args_param_names=(), dtype=None):
+        """ remove the cached result of calc_function(cps, f, args_param_names, dtype=dtype), if any """
+        path = self._get_path(get_cache_key(cps, f, args_param_names, dtype=cps.dtype if dtype is None else dtype))
+        if os.path.exists(path):
+            os.remove(path)
+
+    def clear(self):
+        """ remove all cached results """
+        for _, _, path in self._get_entries():
+            os.remove(path)
+
+    def calc_function(self, cps, f, args_param_names=(), **calc_function_kwargs):
+        """ calc_function, but looked up in the cache first and stored in it afterwards """
+        dtype = calc_function_kwargs.get("dtype")
+        key = get_cache_key(cps, f, args_param_names, dtype=cps.dtype if dtype is None else dtype)
+
+        result = self.load(key)
+        if result is not None and calc_function_kwargs.get("out") is not None:
+            out = open_result_array(calc_function_kwargs["out"], result.shape, result.dtype)
+            out[...] = result
+            result = out
+        elif result is None:
+            result = calc_function(cps, f, args_param_names, **calc_function_kwargs)
+            if result is not None:
+                self.store(key, result)
+
+        return result
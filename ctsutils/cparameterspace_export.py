@@ -0,0 +1,292 @@
+import numpy as np
+import os
+import itertools
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import matplotlib
+import matplotlib.image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from ctsutils.cparameterspace import CParameterSpace, CResult, plot
+from ctsutils.cparameterspace_parallel import _attach_shared_memory
+
+# state of a worker process, set once by _init_worker: the figure is set up once
+# per worker, per frame only the slider indices are sent
+_worker_state = {}
+
+
+def _get_format(path, format):
+    """ """
+    if format is not None:
+        if format not in ("png", "gif", "mp4"):
+            raise ValueError("unknown format: " + repr(format))
+        return format
+
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension in (".gif", ".mp4"):
+        return extension[1:]
+    return "png"
+
+
+def _get_ffmpeg():
+    """ path of the ffmpeg executable (matplotlib's rcParam animation.ffmpeg_path) """
+    ffmpeg = shutil.which(matplotlib.rcParams["animation.ffmpeg_path"])
+    if ffmpeg is None:
+        raise FileNotFoundError("the mp4 format needs ffmpeg, set its path in matplotlib.rcParams['animation.ffmpeg_path']")
+    return ffmpeg
+
+
+def get_frame_indices(slider_params, slider_indices=None):
+    """ the combinations of slider indices to render
+
+    Args:
+        slider_params: the CParams of the sliders
+        slider_indices: None (all combinations), a dict {param name: indices or slice}
+                        (all combinations of the given indices, all indices of the other sliders),
+                        or a list of tuples of indices, one per slider
+    Returns:
+        list of tuples of indices, one per slider
+    """
+    if slider_indices is None:
+        slider_indices = {}
+
+    if not isinstance(slider_indices, dict):
+        frame_indices = [tuple(int(i) for i in indices) for indices in slider_indices]
+        for indices in frame_indices:
+            if len(indices) != len(slider_params):
+                raise ValueError("expected " + str(len(slider_params)) + " slider indices per frame, got " + str(indices))
+        return frame_indices
+
+    unknown = set(slider_indices) - {param.name for param in slider_params}
+    if unknown:
+        raise KeyError("not a slider parameter: " + str(sorted(unknown)))
+
+    ranges = []
+    for param in slider_params:
+        all_indices = np.arange(np.size(param.np_arr))
+        indices = slider_indices.get(param.name, slice(None))
+        ranges.append([int(i) for i in (all_indices[indices] if isinstance(indices, slice) else np.atleast_1d(indices))])
+    return list(itertools.product(*ranges))
+
+
+def _get_frame_title(slider_params, indices):
+    """ e.g. "c = 0.5 mm, d = 3" """
+    return ", ".join(param.name + " = " + "{:.4g}".format(param.np_arr[i]) +
+                     ("" if param.unit is None else " " + param.get_unit_str())
+                     for param, i in zip(slider_params, indices))
+
+
+class CFrameRenderer:
+    def __init__(self, cparams_list, dep_var_mgf, ordering_of_params_name_and_value,
+                 figsize=None, dpi=100, clim=None, plot_kwargs={}):
+        """ renders frames of a plot (see plot) into an Agg canvas, without pyplot:
+        the figure is set up once, each frame only exchanges the slice
+
+        Args:
+            cparams_list: the parameters of the space (a sparse CParameterSpace is made of them)
+            clim: None (the color limits follow each slice) or (vmin, vmax) for all frames
+        """
+        self.cps = CParameterSpace(cparams_list, sparse=True)
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+
+        plot_kwargs = dict(plot_kwargs)
+        if clim is not None:
+            plot_kwargs["update_clim"] = False
+        self.plot_state = plot(self.cps, dep_var_mgf, ordering_of_params_name_and_value,
+                               fig=self.fig, ax=self.ax, sliders=False, **plot_kwargs)
+        if clim is not None:
+            self.plot_state.mesh.set_clim(*clim)
+        self.slider_params = self.plot_state.ordered_params[2:]
+
+    def render(self, indices):
+        """ the frame of the given slider indices as RGBA array of shape (height, width, 4) """
+        for param, i in zip(self.slider_params, indices):
+            self.plot_state.indexing_list_indep_vars[self.cps.get_index_of(param.name)] = i
+        if self.slider_params:
+            self.ax.set_title(_get_frame_title(self.slider_params, indices))
+
+        self.plot_state.redraw(self.cps, self.fig, draw_idle=False)
+        self.fig.canvas.draw()
+        # a copy, the canvas' buffer is overwritten by the next frame
+        return np.array(self.fig.canvas.buffer_rgba())
+
+
+def _init_worker(buffer_spec, shape, dtype, cparams_list, ordering_of_params_name_and_value, renderer_kwargs):
+    """
+    Args:
+        buffer_spec: ("shm", name of the shared memory, 0) or
+                     ("memmap", file name, offset) of the result array
+    """
+    kind, name, offset = buffer_spec
+    if kind == "shm":
+        shm = _attach_shared_memory(name)
+        dep_var_mgf = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    else:
+        shm = None
+        dep_var_mgf = np.memmap(name, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    _worker_state.update(shm=shm,
+                         renderer=CFrameRenderer(cparams_list, dep_var_mgf, ordering_of_params_name_and_value,
+                                                 **renderer_kwargs))
+
+
+def _render_frame(renderer, task):
+    """ render one frame; with a file name, it is written there as PNG, otherwise returned
+
+    Args:
+        task: (slider indices, file name or None)
+    """
+    indices, filename = task
+    rgba = renderer.render(indices)
+    if filename is None:
+        return rgba
+    matplotlib.image.imsave(filename, rgba)
+    return None
+
+
+def _render_frame_in_worker(task):
+    """ task run in the worker processes """
+    return _render_frame(_worker_state["renderer"], task)
+
+
+def _write_gif(path, frames, fps):
+    """ write the RGBA frames as an animated GIF (with Pillow, which matplotlib depends on) """
+    from PIL import Image
+
+    images = (Image.fromarray(rgba).convert("RGB") for rgba in frames)
+    first = next(images)
+    first.save(path, save_all=True, append_images=images, duration=int(round(1000 / fps)), loop=0)
+
+
+def _write_mp4(path, frames, fps):
+    """ write the RGBA frames as H.264 video, piped to ffmpeg as they arrive """
+    ffmpeg = _get_ffmpeg()
+    proc = None
+    try:
+        for rgba in frames:
+            if proc is None:
+                height, width = np.shape(rgba)[:2]
+                proc = subprocess.Popen([ffmpeg, "-y", "-loglevel", "error",
+                                         "-f", "rawvideo", "-pix_fmt", "rgba", "-s", str(width) + "x" + str(height),
+                                         "-r", str(fps), "-i", "-",
+                                         # yuv420p needs an even width and height
+                                         "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                                         "-vcodec", "libx264", "-pix_fmt", "yuv420p", str(path)],
+                                        stdin=subprocess.PIPE)
+            proc.stdin.write(np.ascontiguousarray(rgba).tobytes())
+    except BaseException:
+        if proc is not None:
+            proc.kill()
+        raise
+
+    if proc is not None:
+        proc.stdin.close()
+        if proc.wait() != 0:
+            raise RuntimeError("ffmpeg exited with code " + str(proc.returncode))
+
+
+def export_frames(cps, dep_var_mgf=None, path=None, ordering_of_params_name_and_value=[], slider_indices=None,
+                  format=None, n_workers=None, fps=10, figsize=None, dpi=100, clim=None, **plot_kwargs):
+    """ render the color plot of plot for every combination of slider indices (or a chosen
+    subset) headlessly, to PNG frames or to one GIF / MP4 animation. The frames are rendered
+    with the Agg backend by a pool of worker processes; each sets up its figure once and
+    then only exchanges the shown slice. The result array is shared with the workers
+    through shared memory (or, for a np.memmap, by mapping the same file), not pickled.
+
+    Args:
+        cps, dep_var_mgf: see plot; instead of both, a CResult can be passed as cps,
+                          e.g. export_frames(result, "anim.gif") or export_frames(result, path="frames")
+        path: a directory for the PNG frames (frame_00000.png, ...), or a .gif / .mp4 file
+        ordering_of_params_name_and_value: see plot; the first two parameters are on the axes,
+                                           the others are the sliders (by default the
+                                           first two parameters of the space are on the axes)
+        slider_indices: which frames to render, see get_frame_indices
+        format: "png", "gif" or "mp4" (default: from the extension of path, else "png");
+                "mp4" needs ffmpeg
+        n_workers: number of worker processes (default: os.cpu_count()).
+                   With n_workers=1 everything runs in the calling process.
+        fps: frames per second of an animation
+        figsize, dpi: of the rendered figure
+        clim: None (the color limits follow each slice), (vmin, vmax), or "global"
+              (the limits of the whole result, the same in all frames)
+        plot_kwargs: passed on to plot (e.g. z_label, render_method)
+    Returns:
+        the list of the PNG file names, or path for an animation
+    """
+    if isinstance(cps, CResult):
+        if path is None and isinstance(dep_var_mgf, (str, os.PathLike)):
+            path = dep_var_mgf  # export_frames(result, path)
+        cps, dep_var_mgf = cps.cps, cps.data
+    if path is None:
+        raise TypeError("export_frames needs a path")
+    if cps.is_flat:
+        raise TypeError("only tensor grid spaces can be plotted as frames, not " + type(cps).__name__)
+
+    format = _get_format(path, format)
+    if format == "mp4":
+        _get_ffmpeg()  # fail before rendering
+
+    if len(ordering_of_params_name_and_value) == 0:
+        ordering_of_params_name_and_value = [(name, None) for name in cps.get_param_names()[:2]]
+    _, ordered_params = cps._get_indexing_list_and_ordered_params(ordering_of_params_name_and_value)
+    frame_indices = get_frame_indices(ordered_params[2:], slider_indices)
+
+    if isinstance(clim, str):
+        if clim != "global":
+            raise ValueError("unknown clim: " + repr(clim))
+        clim = (np.nanmin(dep_var_mgf), np.nanmax(dep_var_mgf))
+
+    if format == "png":
+        os.makedirs(path, exist_ok=True)
+        filenames = [os.path.join(path, "frame_{:05d}.png".format(i)) for i in range(len(frame_indices))]
+    else:
+        filenames = [None] * len(frame_indices)
+    tasks = list(zip(frame_indices, filenames))
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    n_workers = max(min(n_workers, len(tasks)), 1)
+
+    renderer_kwargs = dict(figsize=figsize, dpi=dpi, clim=clim, plot_kwargs=plot_kwargs)
+
+    def write(frames):
+        if format == "png":
+            list(frames)  # the frames are written by the renderers
+            return filenames
+        (_write_gif if format == "gif" else _write_mp4)(path, frames, fps)
+        return path
+
+    if n_workers == 1:
+        renderer = CFrameRenderer(cps.cparams_list, dep_var_mgf, ordering_of_params_name_and_value, **renderer_kwargs)
+        return write(_render_frame(renderer, task) for task in tasks)
+
+    shm = None
+    if isinstance(dep_var_mgf, np.memmap) and dep_var_mgf.filename is not None and dep_var_mgf.flags.c_contiguous:
+        # the workers map the same file
+        buffer_spec = ("memmap", dep_var_mgf.filename, dep_var_mgf.offset)
+        dtype = dep_var_mgf.dtype
+    else:
+        dtype = np.result_type(dep_var_mgf)
+        shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(cps.get_shape())) * dtype.itemsize, 1))
+        shared = np.ndarray(cps.get_shape(), dtype=dtype, buffer=shm.buf)
+        shared[...] = dep_var_mgf
+        del shared  # release the buffer before closing the shared memory
+        buffer_spec = ("shm", shm.name, 0)
+
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(buffer_spec, cps.get_shape(), dtype.str, cps.cparams_list,
+                                           ordering_of_params_name_and_value, renderer_kwargs)) as executor:
+            # the frames arrive in order; a few frames per task keep the overhead per task small
+            chunksize = max(len(tasks) // (4 * n_workers), 1)
+            return write(executor.map(_render_frame_in_worker, tasks, chunksize=chunksize))
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,163 @@
+import numpy as np
+import ast
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from ctsutils.cparameterspace import (get_block_slices, open_result_array, get_storage_dtype,
+                                      _apply_storage_dtype, DEFAULT_MAX_BLOCK_BYTES)
+from ctsutils.cparameterspace_parallel import _get_block_axes_arrays
+
+# memory budget of one block for the numpy backend: the temporaries of one block should
+# stay in the (L2) cache
+DEFAULT_EXPRESSION_BLOCK_BYTES = 2**18
+
+# functions and constants which can be used in expressions; the function
+# names are those numexpr understands, so that both backends accept the same expressions
+EXPRESSION_FUNCTIONS = {name: getattr(np, name) for name in
+                        ["sin", "cos", "tan", "arcsin", "arccos", "arctan", "arctan2",
+                         "sinh", "cosh", "tanh", "arcsinh", "arccosh", "arctanh",
+                         "log", "log10", "log1p", "exp", "expm1", "sqrt", "abs",
+                         "conj", "real", "imag", "where"]}
+EXPRESSION_CONSTANTS = {"pi": np.pi, "e": np.e}
+
+
+def _get_numexpr():
+    """ the numexpr module, or None if it is not installed """
+    try:
+        import numexpr
+    except ImportError:
+        return None
+    return numexpr
+
+
+class CExpression:
+    def __init__(self, expr, param_names, backend=None):
+        """ an element-wise expression over parameter names, e.g.
+        "(1 - x/2 + x**5 + y**3) * exp(-x**2 - y**2)", parsed and compiled once.
+
+        Args:
+            expr: the expression; besides the parameters it may use the functions in
+                  EXPRESSION_FUNCTIONS and the constants pi and e (and np.* with the numpy backend)
+            param_names: names of all parameters of the space; the ones used in expr
+                         become the arguments of the expression
+            backend: "numexpr", "numpy" or None (numexpr if it is installed and
+                     understands the expression, numpy otherwise)
+        """
+        self.expr = expr
+        self._code = compile(expr, "<expression>", "eval")
+
+        used_names = {node.id for node in ast.walk(ast.parse(expr, mode="eval")) if isinstance(node, ast.Name)}
+        unknown = used_names - set(param_names) - set(EXPRESSION_FUNCTIONS) - set(EXPRESSION_CONSTANTS) - {"np"}
+        if unknown:
+            raise NameError("unknown names in expression " + repr(expr) + ": " + str(sorted(unknown)))
+
+        # in the order of the space's parameters
+        self.args_param_names = [name for name in param_names if name in used_names]
+
+        numexpr = _get_numexpr()
+        if backend is None:
+            backend = "numexpr" if numexpr is not None and "np" not in used_names else "numpy"
+        if backend not in ("numexpr", "numpy"):
+            raise ValueError("unknown backend: " + repr(backend))
+        if backend == "numexpr":
+            if numexpr is None:
+                raise ImportError("backend 'numexpr' needs the numexpr package")
+            numexpr.validate(expr, local_dict=self._get_local_dict([np.zeros(1)] * len(self.args_param_names)))
+        self.backend = backend
+
+        self._namespace = dict(EXPRESSION_FUNCTIONS, np=np, __builtins__={})
+
+    def _get_local_dict(self, arrays):
+        """ """
+        return dict(EXPRESSION_CONSTANTS, **dict(zip(self.args_param_names, arrays)))
+
+    def __call__(self, *arrays, out=None):
+        """ evaluate the expression; arrays are the values of args_param_names, in that order
+
+        Args:
+            out: optional array of the broadcast shape of the arrays to write the result into
+        """
+        if self.backend == "numexpr":
+            shape = np.broadcast_shapes(*[np.shape(arr) for arr in arrays])
+            local_dict = self._get_local_dict([np.broadcast_to(arr, shape) for arr in arrays])
+            if out is not None and out.flags.c_contiguous and np.shape(out) == shape:
+                # numexpr writes into out directly, without a temporary of the full size
+                return _get_numexpr().evaluate(self.expr, local_dict=local_dict, out=out, casting="same_kind")
+            result = _get_numexpr().evaluate(self.expr, local_dict=local_dict)
+        else:
+            result = eval(self._code, self._namespace, self._get_local_dict(arrays))
+
+        if out is None:
+            return result
+        out[...] = result
+        return out
+
+
+def _get_block_args(axes_arrays, arg_positions, index_slices, is_flat):
+    """ the expression's arguments on one block of the grid: in a grid, the block's
+    sparse meshgrid arrays, so that subexpressions of a single parameter
+    (e.g. exp(-x**2)) are only computed along its axis """
+    block_axes_arrays = _get_block_axes_arrays(axes_arrays, index_slices, is_flat)
+    if not is_flat:
+        block_axes_arrays = np.meshgrid(*block_axes_arrays, indexing="ij", sparse=True)
+    return [block_axes_arrays[p] for p in arg_positions]
+
+
+def calc_expression(cps, expr, args_param_names=(), n_threads=None, backend=None,
+                    max_block_bytes=None, block_axes=None, out=None, dtype=None):
+    """ like calc_function, but for an expression string instead of a function. The grid
+    is evaluated block by block, into one output array, so that the temporaries of the
+    expression only ever have the size of a block instead of the size of the grid.
+
+    Args:
+        expr: see CExpression
+        args_param_names: optional; if given, the expression may use only these parameters
+        n_threads: number of threads evaluating the blocks (default: os.cpu_count()).
+                   numexpr evaluates each block with its own threads instead.
+        backend: see CExpression
+        max_block_bytes: memory budget of one block (default: DEFAULT_EXPRESSION_BLOCK_BYTES
+                         for numpy, DEFAULT_MAX_BLOCK_BYTES for numexpr, which blocks internally)
+        block_axes: axes along which the grid may be split (see get_block_slices)
+        out: array or path of a .npy file to write the result into (see open_result_array)
+        dtype: storage dtype policy of the result and of the parameters' values the
+               expression is evaluated with (default: cps.dtype, see get_storage_dtype)
+    """
+    expression = CExpression(expr, cps.get_param_names(), backend=backend)
+    if len(args_param_names) > 0:
+        not_allowed = set(expression.args_param_names) - set(args_param_names)
+        if not_allowed:
+            raise NameError("expression uses parameters not in args_param_names: " + str(sorted(not_allowed)))
+
+    if n_threads is None:
+        n_threads = os.cpu_count() if expression.backend == "numpy" else 1
+    if max_block_bytes is None:
+        max_block_bytes = DEFAULT_EXPRESSION_BLOCK_BYTES if expression.backend == "numpy" else DEFAULT_MAX_BLOCK_BYTES
+
+    if dtype is None:
+        dtype = cps.dtype
+
+    shape = cps.get_shape()
+    axes_arrays = [_apply_storage_dtype(cp.np_arr, dtype) for cp in cps.cparams_list]
+    arg_positions = [cps.get_index_of(name) for name in expression.args_param_names]
+    block_slices = get_block_slices(shape, max_block_bytes, block_axes=block_axes)
+
+    # the first grid point gives the dtype of the result
+    first_point = tuple(slice(0, 1) for _ in shape)
+    first_value = expression(*_get_block_args(axes_arrays, arg_positions, first_point, cps.is_flat))
+    result = open_result_array(out, shape, get_storage_dtype(dtype, np.result_type(first_value)))
+
+    def evaluate_into_result(index_slices):
+        block_args = _get_block_args(axes_arrays, arg_positions, index_slices, cps.is_flat)
+        expression(*block_args, out=result[index_slices])
+
+    if n_threads > 1 and len(block_slices) > 1:
+        # numpy's ufuncs release the GIL, so the threads run in parallel
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            list(executor.map(evaluate_into_result, block_slices))
+    else:
+        for index_slices in block_slices:
+            evaluate_into_result(index_slices)
+
+    if isinstance(result, np.memmap):
+        result.flush()
+    return result
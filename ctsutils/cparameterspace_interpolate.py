@@ -0,0 +1,102 @@
+import numpy as np
+import itertools
+
+from ctsutils.cparameterspace import CResult
+
+
+class CInterpolator:
+    def __init__(self, cps, dep_var_mgf=None, method="linear", fill_value=np.nan):
+        """ interpolation of a result between the grid points of its CParameterSpace
+
+        Args:
+            cps: the CParameterSpace of the result's axes, or a CResult (then dep_var_mgf is not needed)
+            dep_var_mgf: result array of shape cps.get_shape(), may be a np.memmap
+                         (for "linear" only the grid points next to the queries are read)
+            method: "linear" (multilinear, vectorized over the query points) or
+                    "cubic" (scipy.interpolate.RegularGridInterpolator, which loads the whole result)
+            fill_value: value returned for query points outside of the grid
+        """
+        if isinstance(cps, CResult):
+            cps, dep_var_mgf = cps.cps, cps.data
+
+        assert method in ("linear", "cubic")
+        if np.shape(dep_var_mgf) != cps.get_shape():
+            raise ValueError("result has shape " + str(np.shape(dep_var_mgf)) + ", but the space has shape " + str(cps.get_shape()))
+
+        self.cps = cps
+        self.dep_var_mgf = dep_var_mgf
+        self.method = method
+        self.fill_value = fill_value
+
+        self._cubic_interpolator = None
+
+    def _get_query_arrays(self, params_names_and_values):
+        """ the query arrays in the order of the space's parameters, broadcast against each other """
+        if not isinstance(params_names_and_values, dict):
+            params_names_and_values = dict(params_names_and_values)
+
+        missing = [name for name in self.cps.get_param_names() if name not in params_names_and_values]
+        if missing:
+            raise KeyError("no query values for the parameters " + str(missing))
+
+        return np.broadcast_arrays(*[np.asarray(params_names_and_values[name], dtype=float)
+                                     for name in self.cps.get_param_names()])
+
+    def __call__(self, params_names_and_values):
+        """ interpolated values at the query points
+
+        Args:
+            params_names_and_values: dict or list of tuples (param name, array of query values),
+                                     one entry for every parameter of the space
+        Returns:
+            array of the broadcast shape of the query arrays
+        """
+        query_arrays = self._get_query_arrays(params_names_and_values)
+
+        if self.method == "cubic":
+            return self._interpolate_cubic(query_arrays)
+
+        return self._interpolate_linear(query_arrays)
+
+    def _interpolate_linear(self, query_arrays):
+        """ """
+        brackets = [self.cps.get_axis_index(name).find_bracketing_idx(query)
+                    for name, query in zip(self.cps.get_param_names(), query_arrays)]
+
+        out_of_bounds = np.zeros(np.shape(query_arrays[0]), dtype=bool)
+        weights = []
+        for lo, hi, t in brackets:
+            out_of_bounds |= ~((t >= -1e-12) & (t <= 1 + 1e-12))
+            t = np.clip(np.nan_to_num(t), 0., 1.)
+            weights.append((1. - t, t))
+
+        result = np.zeros(np.shape(query_arrays[0]), dtype=np.result_type(self.dep_var_mgf.dtype, float))
+        # sum over the 2^d corners of the cells around the query points
+        for corner in itertools.product((0, 1), repeat=len(brackets)):
+            w = np.ones(np.shape(result))
+            for (lo, hi, _), weight, c in zip(brackets, weights, corner):
+                w = w * weight[c]
+            idx = tuple(hi if c else lo for (lo, hi, _), c in zip(brackets, corner))
+            result += w * self.dep_var_mgf[idx]
+
+        result[out_of_bounds] = self.fill_value
+        return result
+
+    def _interpolate_cubic(self, query_arrays):
+        """ """
+        if self._cubic_interpolator is None:
+            from scipy.interpolate import RegularGridInterpolator
+
+            # RegularGridInterpolator needs ascending axes
+            data = np.asarray(self.dep_var_mgf)
+            axes = []
+            for i, cp in enumerate(self.cps.cparams_list):
+                order = np.argsort(cp.np_arr, kind="stable")
+                axes.append(np.asarray(cp.np_arr)[order])
+                data = np.take(data, order, axis=i)
+
+            self._cubic_interpolator = RegularGridInterpolator(axes, data, method="cubic",
+                                                               bounds_error=False, fill_value=self.fill_value)
+
+        points = np.stack([np.ravel(query) for query in query_arrays], axis=-1)
+        return np.reshape(self._cubic_interpolator(points), np.shape(query_arrays[0]))
@@ -0,0 +1,229 @@
+import numpy as np
+import os
+import json
+from collections.abc import Mapping
+
+from ctsutils.cparameterspace import CParam, CParameterSpace, CResult
+
+# version of the layout written by save_space
+FORMAT_VERSION = 1
+
+METADATA_FILENAME = "space.json"
+AXES_FILENAME = "axes.npz"
+
+
+def _get_format(path, format):
+    """ """
+    if format is not None:
+        if format not in ("npy", "npz", "hdf5"):
+            raise ValueError("unknown format: " + repr(format))
+        return format
+
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension == ".npz":
+        return "npz"
+    if extension in (".h5", ".hdf5"):
+        return "hdf5"
+    return "npy"
+
+
+def _get_path_with_extension(path, format):
+    """ path with the extension of the single file formats, which load_space goes by
+    (np.savez would append .npz by itself, but the path wouldn't be returned) """
+    extension = os.path.splitext(str(path))[1].lower()
+    if format == "npz" and extension != ".npz":
+        return str(path) + ".npz"
+    if format == "hdf5" and extension not in (".h5", ".hdf5"):
+        return str(path) + ".h5"
+    return path
+
+
+def _get_h5py():
+    """ """
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError("the hdf5 format needs the h5py package") from None
+    return h5py
+
+
+def _dtype_to_str(dtype):
+    """ """
+    return None if dtype is None else np.dtype(dtype).str
+
+
+def _str_to_dtype(dtype_str):
+    """ """
+    return None if dtype_str is None else np.dtype(dtype_str)
+
+
+def _get_result_data(result):
+    """ the array of a result given as array or CResult """
+    return result.data if isinstance(result, CResult) else result
+
+
+def _get_metadata(cps, results, format):
+    """ the JSON metadata: the space's parameters (without their arrays) and, per result,
+    the names of the parameters along its axes and its position in the stored arrays """
+    if cps.is_flat:
+        raise TypeError("only tensor grid spaces can be saved, not " + type(cps).__name__)
+
+    metadata = {"version": FORMAT_VERSION,
+                "format": format,
+                "dtype": _dtype_to_str(cps.dtype),
+                "accumulator_dtype": _dtype_to_str(cps.accumulator_dtype),
+                "params": [{"name": cp.name, "unit": cp.unit} for cp in cps.cparams_list],
+                "results": []}
+
+    for i, (name, result) in enumerate(results.items()):
+        if isinstance(result, CResult):
+            param_names = result.get_param_names()
+            shape = result.cps.get_shape()
+        else:
+            param_names = cps.get_param_names()
+            shape = cps.get_shape()
+            if np.shape(result) != shape:
+                raise ValueError("result " + repr(name) + " has shape " + str(np.shape(result)) +
+                                 ", but the space has shape " + str(shape) + " (pass a CResult for reduced results)")
+
+        metadata["results"].append({"name": name, "key": "result_" + str(i), "param_names": param_names,
+                                    "shape": list(shape), "dtype": np.dtype(np.result_type(_get_result_data(result))).str})
+
+    return metadata
+
+
+def save_space(path, cps, results={}, format=None, compressed=False):
+    """ save a CParameterSpace and any number of named results computed on it.
+    Only the 1-D axes of the parameters are stored, never the meshgrid.
+
+    Args:
+        path: target; the format follows from the extension unless it is given
+        results: dict {name: array of shape cps.get_shape(), or a CResult
+                 whose parameters are a subset of the space's (e.g. a reduced result)}
+        format: "npy" (a directory with a .npy file per result, which load_space memory-maps,
+                plus space.json and axes.npz), "npz" (one file, see np.savez) or
+                "hdf5" (one file, needs h5py)
+        compressed: with "npz", use np.savez_compressed; with "hdf5", gzip the datasets
+                    (compressed results can't be memory-mapped when loading)
+    Returns:
+        the path written to: for the "npz" and "hdf5" formats, the extension .npz / .h5 is
+        appended if path doesn't have it, so that load_space recognizes the format
+    """
+    format = _get_format(path, format)
+    path = _get_path_with_extension(path, format)
+    metadata = _get_metadata(cps, results, format)
+    axes = {"axis_" + str(i): np.asarray(cp.np_arr) for i, cp in enumerate(cps.cparams_list)}
+    arrays = {entry["key"]: _get_result_data(result) for entry, result in zip(metadata["results"], results.values())}
+
+    if format == "npy":
+        os.makedirs(path, exist_ok=True)
+        np.savez(os.path.join(path, AXES_FILENAME), **axes)
+        for key, arr in arrays.items():
+            np.save(os.path.join(path, key + ".npy"), arr)
+        # written last: a directory without it is an incomplete save
+        with open(os.path.join(path, METADATA_FILENAME), "w") as fh:
+            json.dump(metadata, fh, indent=1)
+    elif format == "npz":
+        (np.savez_compressed if compressed else np.savez)(
+            path, metadata=np.array(json.dumps(metadata)), **axes, **arrays)
+    else:
+        h5py = _get_h5py()
+        with h5py.File(path, "w") as fh:
+            fh.attrs["ctsutils_space"] = json.dumps(metadata)
+            for key, arr in dict(axes, **arrays).items():
+                fh.create_dataset(key, data=arr, compression="gzip" if compressed else None)
+
+    return path
+
+
+class CLazyResults(Mapping):
+    def __init__(self, cps, entries, open_array, closer=None):
+        """ the results of a loaded space by name; each array is only opened on first access
+
+        Args:
+            entries: the "results" entries of the metadata
+            open_array: function key -> array-like (memmap, array or h5py dataset)
+            closer: optional object with a close() method (an open npz / hdf5 file)
+        """
+        self.cps = cps
+        self._entries = {entry["name"]: entry for entry in entries}
+        self._open_array = open_array
+        self._closer = closer
+        self._arrays = {}
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = self._open_array(self._entries[name]["key"])
+        return self._arrays[name]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_cresult(self, name):
+        """ the result as a CResult over the parameters of its axes """
+        param_names = self._entries[name]["param_names"]
+        if param_names == self.cps.get_param_names():
+            return CResult(self[name], self.cps)
+
+        cparams = [self.cps.get_param_by_name(param_name) for param_name in param_names]
+        return CResult(self[name], CParameterSpace(cparams, sparse=True, dtype=self.cps.dtype,
+                                                   accumulator_dtype=self.cps.accumulator_dtype))
+
+    def close(self):
+        """ close the underlying file (npz / hdf5); the results can't be accessed afterwards """
+        if self._closer is not None:
+            self._closer.close()
+
+
+def _make_cps(metadata, axes, sparse):
+    """ the CParameterSpace of the metadata, with the meshgrid rebuilt from the axes """
+    cparams = [CParam(param["name"], axis, unit=param["unit"]) for param, axis in zip(metadata["params"], axes)]
+    return CParameterSpace(cparams, sparse=sparse,
+                           dtype=_str_to_dtype(metadata["dtype"]),
+                           accumulator_dtype=_str_to_dtype(metadata["accumulator_dtype"]))
+
+
+def load_space(path, mmap_mode="r", sparse=True):
+    """ load a space saved with save_space. Nothing but the metadata and the axes is read
+    here; with the "npy" format the results are memory-mapped, so that opening a sweep
+    takes about as long for 20 GB of results as for 20 kB.
+
+    Args:
+        mmap_mode: passed to np.load for the results of the "npy" format
+                   (None to read them into memory on first access).
+                   npz results are read on first access; hdf5 results are h5py datasets,
+                   which read from the file when they are indexed.
+        sparse: whether the meshgrid of the loaded space is sparse; a dense one would be
+                allocated in full while loading
+    Returns:
+        (cps, results): the CParameterSpace and a CLazyResults of the results by name
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, METADATA_FILENAME)) as fh:
+            metadata = json.load(fh)
+        with np.load(os.path.join(path, AXES_FILENAME)) as axes_file:
+            axes = [axes_file["axis_" + str(i)] for i in range(len(metadata["params"]))]
+        closer = None
+        open_array = lambda key: np.load(os.path.join(path, key + ".npy"), mmap_mode=mmap_mode)
+    elif _get_format(path, None) == "hdf5":
+        h5py = _get_h5py()
+        fh = h5py.File(path, "r")
+        metadata = json.loads(fh.attrs["ctsutils_space"])
+        axes = [fh["axis_" + str(i)][()] for i in range(len(metadata["params"]))]
+        closer = fh
+        open_array = lambda key: fh[key]
+    else:
+        npz_file = np.load(path)
+        metadata = json.loads(str(npz_file["metadata"]))
+        axes = [npz_file["axis_" + str(i)] for i in range(len(metadata["params"]))]
+        closer = npz_file
+        open_array = lambda key: npz_file[key]
+
+    if metadata["version"] > FORMAT_VERSION:
+        raise ValueError("saved with a newer format version: " + str(metadata["version"]))
+
+    cps = _make_cps(metadata, axes, sparse)
+    return cps, CLazyResults(cps, metadata["results"], open_array, closer=closer)
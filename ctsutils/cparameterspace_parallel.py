@@ -0,0 +1,192 @@
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from ctsutils.cparameterspace import (get_block_slices, open_result_array, get_storage_dtype,
+                                      _apply_storage_dtype, DEFAULT_MAX_BLOCK_BYTES)
+
+# state of a worker process, set once by _init_worker, so that per task
+# only the index slices of the block have to be sent
+_worker_state = {}
+
+
+def _attach_shared_memory(shm_name):
+    """ attach to an existing shared memory block without letting the
+    worker's resource tracker unlink it when the worker exits """
+    try:
+        return shared_memory.SharedMemory(name=shm_name, track=False)  # python >= 3.13
+    except TypeError:
+        return shared_memory.SharedMemory(name=shm_name)
+
+
+def _get_block_axes_arrays(axes_arrays, index_slices, is_flat):
+    """ the arrays of all parameters restricted to a block """
+    if is_flat:
+        # flat spaces have one (1-D) axis, along which all parameters' arrays run
+        return [arr[index_slices[0]] for arr in axes_arrays]
+
+    return [arr[sl] for arr, sl in zip(axes_arrays, index_slices)]
+
+
+def _evaluate_block_into(out, block_axes_arrays, arg_positions, f, per_point, is_flat=False):
+    """ evaluate f on the grid spanned by block_axes_arrays and write the result into out
+
+    Args:
+        out: array of the block's shape to write into (e.g. a view into shared memory)
+        block_axes_arrays: the 1-D arrays of all parameters, restricted to the block
+        arg_positions: positions (in block_axes_arrays) of the arguments of f
+        per_point: if True, f is a scalar function and is called once per grid point
+        is_flat: if True, the block_axes_arrays are not axes of a grid, but the
+                 coordinates of a flat list of points (see CParameterSpace.is_flat)
+    """
+    if is_flat:
+        if per_point:
+            for i, point in enumerate(zip(*[block_axes_arrays[p] for p in arg_positions])):
+                out[i] = f(*point)
+        else:
+            out[...] = f(*[block_axes_arrays[p] for p in arg_positions])
+    elif per_point:
+        for idx in np.ndindex(out.shape):
+            out[idx] = f(*[block_axes_arrays[p][idx[p]] for p in arg_positions])
+    else:
+        # same as the dense meshgrid restricted to the block, but only as broadcast views
+        sparse_mg = np.meshgrid(*block_axes_arrays, indexing="ij", sparse=True)
+        out[...] = f(*[np.broadcast_to(sparse_mg[p], out.shape) for p in arg_positions])
+
+
+def _init_worker(buffer_spec, shape, dtype, axes_arrays, arg_positions, f, per_point, is_flat):
+    """
+    Args:
+        buffer_spec: ("shm", name of the shared memory, 0) or
+                     ("memmap", file name, offset) of the result buffer
+    """
+    kind, name, offset = buffer_spec
+    if kind == "shm":
+        shm = _attach_shared_memory(name)
+        result = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    else:
+        shm = None
+        result = np.memmap(name, dtype=dtype, mode="r+", offset=offset, shape=shape)
+
+    _worker_state.update(shm=shm,
+                         result=result,
+                         axes_arrays=axes_arrays,
+                         arg_positions=arg_positions,
+                         f=f,
+                         per_point=per_point,
+                         is_flat=is_flat)
+
+
+def _evaluate_block_in_worker(index_slices):
+    """ task run in the worker processes: the result goes directly into shared memory,
+    nothing but the index slices is pickled in either direction """
+    ws = _worker_state
+    _evaluate_block_into(ws["result"][index_slices],
+                         _get_block_axes_arrays(ws["axes_arrays"], index_slices, ws["is_flat"]),
+                         ws["arg_positions"], ws["f"], ws["per_point"], ws["is_flat"])
+
+
+def _probe_dtype(axes_arrays, arg_positions, f, per_point, is_flat):
+    """ evaluate f on the first grid point only, to know the dtype of the result
+    before allocating it """
+    first_point = [arr[:1] for arr in axes_arrays]
+    if per_point:
+        # a scalar function may return an int or bool at some points (e.g. "return 0" in a
+        # branch) and floats at others, so the type of one value is promoted to at least float64
+        return np.result_type(np.asarray(f(*[first_point[p][0] for p in arg_positions])), np.float64)
+
+    if is_flat:
+        return np.asarray(f(*[first_point[p] for p in arg_positions])).dtype
+
+    sparse_mg = np.meshgrid(*first_point, indexing="ij", sparse=True)
+    return np.asarray(f(*[sparse_mg[p] for p in arg_positions])).dtype
+
+
+def calc_function_parallel(cps, f, args_param_names=(), n_workers=None, per_point=False,
+                           max_block_bytes=None, block_axes=None, dtype=None, out=None):
+    """ like calc_function, but the grid is split into tiles which are
+    evaluated by a pool of worker processes.
+
+    Args:
+        f: has to be picklable (e.g. defined at module level), unless
+           the processes are started with fork
+        n_workers: number of worker processes (default: os.cpu_count()).
+                   With n_workers=1 everything runs in the calling process.
+        per_point: if True, f takes scalars and is called once per grid point
+                   (for functions which cannot be vectorized); the result is then
+                   at least float64 (complex, if f returns complex at the first point)
+        max_block_bytes: memory budget of one tile (default: about 4 tiles per worker,
+                         or DEFAULT_MAX_BLOCK_BYTES with n_workers=1)
+        block_axes: axes along which the grid may be split (see get_block_slices)
+        dtype: storage dtype policy of the result (default: cps.dtype, see get_storage_dtype),
+               applied to the dtype f returns at the first grid point
+        out: array or path of a .npy file to write the result into (see open_result_array);
+             the workers write into a np.memmap directly instead of into shared memory
+    """
+    if len(args_param_names) == 0:
+        print("nothing sampled!")
+        return None
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    if dtype is None:
+        dtype = cps.dtype
+
+    shape = cps.get_shape()
+    axes_arrays = [_apply_storage_dtype(cp.np_arr, dtype) for cp in cps.cparams_list]
+    arg_positions = [cps.get_index_of(name) for name in args_param_names]
+
+    dtype = get_storage_dtype(dtype, _probe_dtype(axes_arrays, arg_positions, f, per_point, cps.is_flat))
+    if dtype.hasobject:
+        raise TypeError("f returns objects, which can't be put into shared memory: " + str(dtype))
+
+    result = None
+    if out is not None:
+        result = open_result_array(out, shape, dtype)
+
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    if max_block_bytes is None:
+        max_block_bytes = max(nbytes // (4 * n_workers), dtype.itemsize) if n_workers > 1 else DEFAULT_MAX_BLOCK_BYTES
+    block_slices = get_block_slices(shape, max_block_bytes, block_axes=block_axes, itemsize=dtype.itemsize)
+
+    if n_workers == 1:
+        if result is None:
+            result = np.empty(shape, dtype=dtype)
+        for index_slices in block_slices:
+            _evaluate_block_into(result[index_slices], _get_block_axes_arrays(axes_arrays, index_slices, cps.is_flat),
+                                 arg_positions, f, per_point, cps.is_flat)
+        if isinstance(result, np.memmap):
+            result.flush()
+        return result
+
+    shm = None
+    if isinstance(result, np.memmap) and result.filename is not None and result.flags.c_contiguous:
+        # the workers map the same file and write into it directly
+        buffer_spec = ("memmap", result.filename, result.offset)
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        buffer_spec = ("shm", shm.name, 0)
+
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(buffer_spec, shape, dtype.str, axes_arrays, arg_positions, f, per_point, cps.is_flat)) as executor:
+            # consume the iterator, so that exceptions from the workers are raised here
+            list(executor.map(_evaluate_block_in_worker, block_slices))
+
+        if shm is not None:
+            shared_result = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            if result is None:
+                result = shared_result.copy()
+            else:
+                result[...] = shared_result
+            del shared_result  # release the buffer before closing the shared memory
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    if isinstance(result, np.memmap):
+        result.flush()
+    return result
@@ -0,0 +1,180 @@
+import numpy as np
+
+from ctsutils.cparameterspace import (CParameterSpace, CAxisIndex, calc_function,
+                                      get_cparams_refined_ranges_around_minimum)
+
+
+class CRefinementLevel:
+    def __init__(self, cps, result, n_evaluations, n_reused):
+        """ one grid of the coarse-to-fine search, around one candidate minimum
+
+        Args:
+            cps: the CParameterSpace of this level
+            result: f evaluated on cps
+            n_evaluations: number of grid points at which f was actually evaluated
+            n_reused: number of grid points taken over from the parent level
+        """
+        self.cps = cps
+        self.result = result
+        self.n_evaluations = n_evaluations
+        self.n_reused = n_reused
+
+        self.argmin_idx = np.unravel_index(np.argmin(result), np.shape(result))
+        self.min_value = result[self.argmin_idx]
+        self.argmin = tuple((cp.name, cp.np_arr[i]) for cp, i in zip(cps.cparams_list, self.argmin_idx))
+
+
+class CRefinementResult:
+    def __init__(self, levels):
+        """
+        Args:
+            levels: list (one entry per level) of lists (one entry per candidate) of CRefinementLevel
+        """
+        self.levels = levels
+
+        self.n_evaluations = sum(level.n_evaluations for candidates in levels for level in candidates)
+
+        best = min(levels[-1], key=lambda level: level.min_value)
+        self.min_value = best.min_value
+        self.argmin = best.argmin
+
+    def get_uniform_grid_evaluations(self):
+        """ number of evaluations a uniform grid over the coarsest space would need
+        to reach the finest resolution reached here """
+        n = 1
+        coarse = self.levels[0][0].cps
+        for cp in coarse.cparams_list:
+            if np.size(cp.np_arr) < 2:
+                continue
+            finest_step = min(np.min(np.abs(np.diff(level.cps.get_arr(cp.name))))
+                              for candidates in self.levels for level in candidates
+                              if np.size(level.cps.get_arr(cp.name)) > 1)
+            n *= int(np.ceil((np.max(cp.np_arr) - np.min(cp.np_arr)) / finest_step)) + 1
+        return n
+
+
+def _get_local_minima_indices(result, n_candidates):
+    """ multi-indices of the n_candidates smallest local minima of result (smallest first) """
+    mask = np.ones(np.shape(result), dtype=bool)
+    for ax in range(np.ndim(result)):
+        padded = np.pad(result, [(1, 1) if a == ax else (0, 0) for a in range(np.ndim(result))],
+                        mode="constant", constant_values=np.inf)
+        mask &= result <= np.take(padded, range(0, np.shape(result)[ax]), axis=ax)
+        mask &= result <= np.take(padded, range(2, np.shape(result)[ax] + 2), axis=ax)
+
+    flat_candidates = np.flatnonzero(mask)
+    flat_candidates = flat_candidates[np.argsort(np.ravel(result)[flat_candidates], kind="stable")]
+    return [np.unravel_index(i, np.shape(result)) for i in flat_candidates[:n_candidates]]
+
+
+def _get_local_step(arr, idx):
+    """ distance of arr[idx] to its nearest neighbor """
+    return np.min(np.abs(np.diff(arr[max(idx - 1, 0):idx + 2])))
+
+
+def _is_resolved(level, args_param_names, xtol):
+    """ whether the grid spacing of level around its minimum is at most xtol for all parameters """
+    for name in args_param_names:
+        arr = level.cps.get_arr(name)
+        tol = xtol[name] if isinstance(xtol, dict) else xtol
+        if np.size(arr) > 1 and _get_local_step(arr, level.argmin_idx[level.cps.get_index_of(name)]) > tol:
+            return False
+    return True
+
+
+def _evaluate_reusing_parent(cps, f, args_param_names, parent, per_point):
+    """ evaluate f on cps, but take the values at grid points which coincide
+    with grid points of the parent level from there
+
+    Returns:
+        (result, n_evaluations, n_reused)
+    """
+    parent_indices = []
+    matches = []
+    for i, cp in enumerate(cps.cparams_list):
+        parent_arr = parent.cps.get_arr(cp.name)
+        idx = CAxisIndex(parent_arr).find_nearest_idx(cp.np_arr)
+        atol = 1e-6 * (np.min(np.abs(np.diff(parent_arr))) if np.size(parent_arr) > 1 else 1.)
+        match = np.abs(parent_arr[idx] - cp.np_arr) <= atol
+
+        # shape the per-axis arrays, so that they broadcast to the grid
+        broadcast_shape = [1] * cps.get_dimension()
+        broadcast_shape[i] = np.size(cp.np_arr)
+        parent_indices.append(np.reshape(idx, broadcast_shape))
+        matches.append(np.reshape(match, broadcast_shape))
+
+    reused = np.broadcast_to(np.logical_and.reduce(np.broadcast_arrays(*matches)), cps.get_shape())
+    missing = ~reused
+
+    result = np.empty(cps.get_shape(), dtype=np.result_type(parent.result))
+    result[reused] = np.broadcast_to(parent.result[tuple(parent_indices)], cps.get_shape())[reused]
+
+    coords = [cps.get_broadcast_mgf_arr(name)[missing] for name in args_param_names]
+    if per_point:
+        result[missing] = [f(*point) for point in zip(*coords)]
+    else:
+        result[missing] = f(*coords)
+
+    n_evaluations = int(np.count_nonzero(missing))
+    return result, n_evaluations, result.size - n_evaluations
+
+
+def refine_minimum(cps, f, args_param_names, n_levels=4, xtol=None, n_candidates=1,
+                   refine_factor=4, half_width=1, per_point=False):
+    """ coarse-to-fine search for the minimum of f: evaluate f on cps, then repeatedly
+    build a finer grid around the minimum (with get_cparams_refined_ranges_around_minimum)
+    and evaluate f there, reusing the values at points the finer grid shares with the coarser one.
+
+    Args:
+        f: function of the parameters args_param_names; it has to work on flat
+           arrays of points (ufunc-style), or on scalars with per_point=True
+        n_levels: maximum number of levels (including the coarse one), None for no limit (then xtol is needed)
+        xtol: stop once the grid spacing around each minimum is at most xtol,
+              either a number or a dict {param name: tolerance}
+        n_candidates: number of local minima of the coarse grid which are followed
+        refine_factor: each level's step is the parent step divided by refine_factor
+        half_width: each level spans +- half_width parent steps around the minimum
+    Returns:
+        CRefinementResult
+    """
+    result = calc_function(cps, f, args_param_names, per_point=per_point)
+    coarse = CRefinementLevel(cps, np.broadcast_to(result, cps.get_shape()), result.size, 0)
+
+    # follow each candidate minimum separately: list of (parent level, index of the minimum in it)
+    lineages = [(coarse, min_idx) for min_idx in _get_local_minima_indices(coarse.result, n_candidates)]
+    levels = [[coarse]]
+
+    assert n_levels is not None or xtol is not None
+
+    level_nr = 1
+    while n_levels is None or level_nr < n_levels:
+        new_candidates = []
+        for parent, min_idx in lineages:
+            minimum_tuple = tuple((cp.name, cp.np_arr[i]) for cp, i in zip(parent.cps.cparams_list, min_idx))
+
+            which_to_update = []
+            for name in args_param_names:
+                parent_arr = parent.cps.get_arr(name)
+                if np.size(parent_arr) < 2:
+                    continue
+                width = half_width * _get_local_step(parent_arr, min_idx[parent.cps.get_index_of(name)])
+                which_to_update.append((name, (-width, width), 2 * half_width * refine_factor + 1))
+
+            cparams_new = get_cparams_refined_ranges_around_minimum(parent.cps, minimum_tuple, which_to_update)
+            for cp in cparams_new:
+                # stay inside the coarse space
+                coarse_arr = cps.get_arr(cp.name)
+                cp.np_arr = cp.np_arr[(cp.np_arr >= np.min(coarse_arr)) & (cp.np_arr <= np.max(coarse_arr))]
+
+            new_cps = CParameterSpace(cparams_new, sparse=True)
+            new_result, n_evaluations, n_reused = _evaluate_reusing_parent(new_cps, f, args_param_names, parent, per_point)
+            new_candidates.append(CRefinementLevel(new_cps, new_result, n_evaluations, n_reused))
+
+        levels.append(new_candidates)
+        lineages = [(level, level.argmin_idx) for level in new_candidates]
+        level_nr += 1
+
+        if xtol is not None and all(_is_resolved(level, args_param_names, xtol) for level in new_candidates):
+            break
+
+    return CRefinementResult(levels)
@@ -0,0 +1,93 @@
+import numpy as np
+
+from ctsutils.cparameterspace import (CParam, CParameterSpace, CAxisIndex, _apply_storage_dtype,
+                                      DEFAULT_ACCUMULATOR_DTYPE)
+
+
+def draw_unit_samples(n_samples, dimension, method="sobol", seed=None):
+    """ n_samples points in the unit hypercube [0, 1)^dimension
+
+    Args:
+        method: "sobol" (scrambled Sobol sequence), "lhs" (Latin hypercube)
+                or "random" (uniform pseudo-random numbers)
+        seed: seed or np.random.Generator, for reproducible samples
+    Returns:
+        array of shape (n_samples, dimension)
+    """
+    if method == "random":
+        return np.random.default_rng(seed).random((n_samples, dimension))
+
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        raise ImportError("method " + repr(method) + " needs scipy >= 1.7 (scipy.stats.qmc)") from None
+
+    if method == "sobol":
+        sampler = qmc.Sobol(dimension, scramble=True, seed=seed)
+    elif method == "lhs":
+        sampler = qmc.LatinHypercube(dimension, seed=seed)
+    else:
+        raise ValueError("unknown sampling method: " + repr(method))
+
+    return sampler.random(n_samples)
+
+
+class CSampledParameterSpace(CParameterSpace):
+    is_flat = True
+
+    def __init__(self, cparams_list, n_samples, method="sobol", seed=None, dtype=None,
+                 accumulator_dtype=DEFAULT_ACCUMULATOR_DTYPE):
+        """ instead of the full tensor grid of the CParams' arrays, a fixed budget of
+        quasi-random points inside their ranges, for spaces with so many parameters
+        that the grid is out of reach. Parameters whose array is log-uniformly spaced
+        are sampled log-uniformly.
+
+        The points form one flat axis: get_shape() is (n_samples,), get_mgf_arr / get_arr
+        return the 1-D arrays of the points' coordinates, so calc_function evaluates f on
+        flat arrays and the query_* methods return the best points.
+
+        Args:
+            cparams_list: CParam objects whose arrays define the ranges
+            n_samples: number of points (powers of 2 keep the balance properties of sobol)
+            method, seed: see draw_unit_samples
+            dtype, accumulator_dtype: see CParameterSpace
+        """
+        self.range_cparams_list = cparams_list
+        self.method = method
+
+        unit_samples = draw_unit_samples(n_samples, len(cparams_list), method=method, seed=seed)
+
+        sampled_cparams = []
+        for cp, unit_column in zip(cparams_list, unit_samples.T):
+            axis_index = CAxisIndex(cp.np_arr)
+            axis_index._check_numeric()  # the range of the samples is that of the array
+            if axis_index.is_log_uniform:
+                lo, hi = np.log(axis_index.min), np.log(axis_index.max)
+                column = np.exp(lo + unit_column * (hi - lo))
+            else:
+                column = axis_index.min + unit_column * (axis_index.max - axis_index.min)
+            sampled_cparams.append(CParam(cp.name, column, unit=cp.unit))
+
+        CParameterSpace.__init__(self, sampled_cparams, dtype=dtype, accumulator_dtype=accumulator_dtype)
+
+    def _make_meshgrid(self):
+        """ no grid: each parameter's "meshgrid array" is its array of sample coordinates """
+        self._meshgrid = [_apply_storage_dtype(cp.np_arr, self.dtype) for cp in self.cparams_list]
+
+    def get_shape(self):
+        """ """
+        return (np.size(self.cparams_list[0].np_arr),) if self.cparams_list else ()
+
+    def get_n_samples(self):
+        """ """
+        return self.get_shape()[0]
+
+    def query_flat_indices(self, flat_indices, dep_var_mgf, reduced_dimensions_indices=[]):
+        """ coordinates and values of the sample points at flat_indices (see
+        CParameterSpace.query_flat_indices; there are no axes to reduce here) """
+        assert len(reduced_dimensions_indices) == 0
+        self._check_result_shape(dep_var_mgf, [])
+
+        flat_indices = np.asarray(flat_indices, dtype=np.intp)
+        return self._get_points([flat_indices] * self.get_dimension(), (flat_indices,), np.size(flat_indices),
+                                dep_var_mgf, [])
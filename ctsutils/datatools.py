@@ -5,16 +5,45 @@ def get_nth_smallest_curve(x, y, n):
     """
     Arguments:
     x -- 1d array
-    y -- columns of different y values (all sharing the same x values)
+    y -- 1d array, or columns of different y values (all sharing the same x values)
+    n -- int or list of ints (e.g. range(10) for the 10 lowest curves at once)
     n=0: lowest
     n=1: 2nd lowest, ...
+    n=-1: highest, ...
+
+    Returns:
+    x, y_requested -- y_requested[i] is the nth lowest of all y values at x == x[i],
+                      of shape (len(x),) for an int n, (len(x), len(n)) for a list of n
     """
 
-    y_requested = np.array([])
+    x = np.asarray(x)
+    y = np.reshape(y, (np.shape(x)[0], -1))  # one row of y values per x value
+    ns = np.atleast_1d(n)
+
+    # group the rows by their x value
+    x_unique, inverse, counts = np.unique(x, return_inverse=True, return_counts=True)
+    n_values_min = np.min(counts) * np.shape(y)[1]
+    if np.any(ns >= n_values_min) or np.any(ns < -n_values_min):
+        raise IndexError("n = " + str(n) + " is out of range for an x value with only " + str(n_values_min) + " y values")
+
+    rows = y[np.argsort(inverse, kind="stable")]
+    first_rows = np.cumsum(counts) - counts
+    y_requested = np.empty((len(x_unique), len(ns)), dtype=y.dtype)
+
+    # the groups with the same number of rows are partitioned at once, one group per row
+    for count in np.unique(counts):
+        groups = np.flatnonzero(counts == count)
+        if len(groups) == len(x_unique):
+            values = rows.reshape(len(groups), -1)
+        else:
+            values = rows[first_rows[groups, None] + np.arange(count)].reshape(len(groups), -1)
+        kth = np.where(ns < 0, ns + np.shape(values)[1], ns)
+        values.partition(np.unique(kth), axis=1)
+        y_requested[groups] = values[:, kth]
 
-    for k in x:
-        # for each x value, get the nth lowest y value
-        y_requested = np.append(y_requested, np.sort(np.ravel(y[x == k]))[n])
+    y_requested = y_requested[inverse]
+    if np.ndim(n) == 0:
+        y_requested = y_requested[:, 0]
 
     return x, y_requested  # as x, y data
 
@@ -18,5 +18,13 @@ setuptools.setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
+    # 3.8: multiprocessing.shared_memory, 3.9: tracemalloc.reset_peak (CProfiler)
+    python_requires='>=3.9',
+    install_requires=[
+        "numpy>=1.20",  # np.broadcast_shapes
+        # 1.7: scipy.stats.qmc, 1.9: RegularGridInterpolator(method="cubic"),
+        # 1.11: simpson's handling of an even number of points, which calc_function_reduced relies on
+        "scipy>=1.11",
+        "matplotlib>=3.3",
+    ],
 )